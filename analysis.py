@@ -1,209 +1,340 @@
+import argparse
 import pandas as pd
 import numpy as np
 import os
-from collections import Counter
-from prefixspan import PrefixSpan
+
+import incremental
+import instrument
+import mining
+import parallel
+import patterns
+import sampling
+import sessions
+from sequences import INTERACTION_EVENTS, PATTERN_SEPARATOR
 
 input_folder = './split_data'
 output_folder = './analysis_results'
-os.makedirs(output_folder, exist_ok=True)
-
-chunk_files = [f'chunk_{i}.csv' for i in range(1, 86)]
+state_folder = os.path.join(output_folder, '_state')
 
 # Parameters
 TOP_K = 10
 MIN_LEN_GENERAL = 2
 MIN_LEN_INTERACTION = 2
 MIN_LEN_INTERACTION_STRONG = 3
-
-def contains_subsequence(session, pattern):
-    pattern_idx = 0
-    for event in session:
-        if event == pattern[pattern_idx]:
-            pattern_idx += 1
-            if pattern_idx == len(pattern):
-                return True
-    return False
-
-def session_has_interaction(session):
-    return any(x in session for x in ['cart', 'purchase', 'remove_from_cart'])
-
-def extract_patterns(sequences, min_len=2, interaction_only=False):
-    ps = PrefixSpan(sequences)
-    patterns = ps.topk(k=500, closed=False)
-    filtered_patterns = []
-    for support, seq in patterns:
-        if len(seq) >= min_len:
-            if not interaction_only or any(x in seq for x in ['cart', 'purchase', 'remove_from_cart']):
-                filtered_patterns.append((support, seq))
-    return filtered_patterns[:TOP_K]
-
-def count_full_sessions(session_sequences):
-    return Counter([tuple(seq) for seq in session_sequences])
-
-# Load Data
-print("Loading all chunks...")
-dfs = []
-for file in chunk_files:
-    df = pd.read_csv(os.path.join(input_folder, file), low_memory=False)
-    dfs.append(df)
-
-data = pd.concat(dfs, ignore_index=True)
-print(f"Loaded {len(data)} rows.")
-
-# Clean Data
-print("Cleaning data...")
-data['event_time'] = pd.to_datetime(data['event_time'], utc=True)
-data['event_hour'] = data['event_time'].dt.hour
-data['time_of_day'] = data['event_hour'].apply(lambda h:
-    'Morning' if 5 <= h < 12 else
-    'Afternoon' if 12 <= h < 17 else
-    'Evening' if 17 <= h < 22 else
-    'Night'
-)
-
-data.dropna(subset=['event_type', 'product_id', 'user_session', 'price', 'price_chunk', 'main_category'], inplace=True)
-
-print("Building sessions...")
-session_sequences = data.sort_values(['user_session', 'event_time']).groupby('user_session')['event_type'].apply(list)
-session_avg_price = data.groupby('user_session')['price'].mean()
-session_time_of_day = data.groupby('user_session')['time_of_day'].agg(lambda x: x.mode().iloc[0] if not x.mode().empty else None)
-session_price_chunk = data.groupby('user_session')['price_chunk'].agg(lambda x: x.mode().iloc[0] if not x.mode().empty else None)
-session_main_category = data.groupby('user_session')['main_category'].agg(lambda x: x.mode().iloc[0] if not x.mode().empty else None)
-session_duration_sec = data.groupby('user_session')['event_time'].agg(lambda x: (x.max() - x.min()).total_seconds())
-
-session_df = pd.DataFrame({
-    'session_sequence': session_sequences,
-    'avg_price': session_avg_price,
-    'time_of_day': session_time_of_day,
-    'price_chunk': session_price_chunk,
-    'main_category': session_main_category,
-    'duration_sec': session_duration_sec
-}).reset_index()
-
-session_df = session_df[session_df['session_sequence'].apply(session_has_interaction)]
-
-# Run analysis
-def analyze_section(group_label, group_sessions, section_name):
+# PrefixSpan patterns tracked per variant for incremental refreshes, and
+# mined from the sample per variant in sampling mode
+CANDIDATE_K = 5 * TOP_K
+# Sampling mode: subgroups up to this many sessions are mined whole
+MIN_SAMPLE_SESSIONS = 2_000
+SAMPLE_SEED = 0
+
+PREFIXSPAN_VARIANTS = [
+    ('prefixspan_general', MIN_LEN_GENERAL, False),
+    ('prefixspan_interaction_gt2', MIN_LEN_INTERACTION, True),
+    ('prefixspan_interaction_gt3', MIN_LEN_INTERACTION_STRONG, True)
+]
+
+SECTIONS = ['price_chunk', 'main_category', 'time_of_day']
+SESSION_COLUMNS = [
+    'user_session', 'avg_price', 'duration_sec', 'time_of_day', 'price_chunk', 'main_category',
+    'first_cart', 'first_purchase', 'first_remove'
+]
+# Pool workers only need the subgroup columns, not the session ids
+WORKER_COLUMNS = [col for col in SESSION_COLUMNS if col != 'user_session']
+
+def extract_patterns(sequences, variants=PREFIXSPAN_VARIANTS, k=TOP_K):
+    # A single constrained top-k search serves every variant
+    constraints = [(min_len, INTERACTION_EVENTS if interaction_only else None) for _, min_len, interaction_only in variants]
+    return mining.mine_topk(sequences, constraints, k)
+
+def sampled_patterns(sequences, sample_fraction, candidate_k):
+    # Mines candidate_k patterns per variant on a stratified sample. Only
+    # candidates whose 95% Wilson upper bound reaches the TOP_K-th best lower
+    # bound of their variant can still be in its top TOP_K; those are
+    # re-counted on all sessions in one batched walk, which also serves the
+    # stats. The top TOP_K by exact support are kept, with the support the
+    # sample predicted and its bounds.
+    sample = sampling.stratified_sample(sequences.lengths, sample_fraction, MIN_SAMPLE_SESSIONS, SAMPLE_SEED)
+    with instrument.stage('prefixspan', rows_in=len(sample)) as stage:
+        candidates = [
+            (label, support, seq)
+            for (label, _, _), variant_patterns in zip(PREFIXSPAN_VARIANTS, extract_patterns(sequences.take(sample), k=candidate_k))
+            for support, seq in variant_patterns
+        ]
+        stage.rows_out = len(candidates)
+    estimate, low, high = sampling.support_bounds([support for _, support, _ in candidates], len(sample), len(sequences))
+
+    plausible = []
+    for label, _, _ in PREFIXSPAN_VARIANTS:
+        variant = [k for k, candidate in enumerate(candidates) if candidate[0] == label]
+        cutoff = np.sort(low[variant])[::-1][TOP_K - 1] if len(variant) >= TOP_K else -np.inf
+        plausible.extend(k for k in variant if high[k] >= cutoff)
+
+    # Variants share patterns; each distinct one is matched once
+    verify = list(dict.fromkeys(tuple(candidates[k][2]) for k in plausible))
+    with instrument.stage('match_patterns', rows_in=len(sequences)) as stage:
+        membership = patterns.match_subsequences(sequences, [list(seq) for seq in verify])
+        stage.rows_out = len(verify)
+    column = {seq: j for j, seq in enumerate(verify)}
+    exact = membership.sum(axis=0)
+
+    # Ranked like the exact mode: support, then pattern
+    keep = []
+    for label, _, _ in PREFIXSPAN_VARIANTS:
+        ranked = sorted(
+            (k for k in plausible if candidates[k][0] == label),
+            key=lambda k: (-exact[column[tuple(candidates[k][2])]], candidates[k][2])
+        )
+        keep.extend(ranked[:TOP_K])
+    columns = [column[tuple(candidates[k][2])] for k in keep]
+    mined = [(candidates[k][0], int(exact[j]), candidates[k][2]) for k, j in zip(keep, columns)]
+    bounds = [
+        {'occurrences_estimate': estimate[k], 'occurrences_low': low[k], 'occurrences_high': high[k]}
+        for k in keep
+    ]
+    return [(label, seq) for label, _, seq in candidates], mined, membership[:, columns], bounds
+
+def analyze_section(group_label, group_sessions, group_sequences, section_name, collapse_repeats=False, candidate_k=TOP_K, sample_fraction=None):
+    # Returns the result rows and every mined (type, support, pattern); with
+    # candidate_k > TOP_K the extra patterns are only kept as candidates.
+    # With sample_fraction the PrefixSpan patterns are mined on a sample and
+    # verified on every session.
     print(f"Analyzing section {section_name}: {group_label}...")
     results = []
 
-    # FULL session matches
-    full_counts = count_full_sessions(group_sessions['session_sequence'])
-    top_full_sessions = full_counts.most_common(TOP_K)
+    # FULL session matches (sessions equal to a pattern)
+    with instrument.stage('full_sessions', rows_in=len(group_sequences)):
+        full_patterns, full_counts, labels = patterns.count_full_sessions(group_sequences, TOP_K)
+        membership = labels[:, None] == np.arange(len(full_patterns))
 
-    for pattern, count in top_full_sessions:
-        matched = group_sessions[group_sessions['session_sequence'].apply(lambda s: s == list(pattern))]
+    for pattern, count, stats in zip(full_patterns, full_counts, patterns.membership_stats(membership, group_sessions)):
         results.append({
             'section': section_name,
             'subgroup': group_label,
             'type': 'full_session',
             'pattern': pattern,
             'occurrences': count,
-            'avg_price': matched['avg_price'].mean(),
-            'common_time_of_day': matched['time_of_day'].mode().iloc[0] if not matched['time_of_day'].empty else None,
-            'avg_duration_sec': matched['duration_sec'].mean()
+            **stats
         })
 
     # PrefixSpan sessions
-    for label, min_len, interaction_only in [
-        ('prefixspan_general', MIN_LEN_GENERAL, False),
-        ('prefixspan_interaction_gt2', MIN_LEN_INTERACTION, True),
-        ('prefixspan_interaction_gt3', MIN_LEN_INTERACTION_STRONG, True)
-    ]:
-        patterns = extract_patterns(group_sessions['session_sequence'].tolist(), min_len=min_len, interaction_only=interaction_only)
-        for support, seq in patterns:
-            matched = group_sessions[group_sessions['session_sequence'].apply(lambda s: contains_subsequence(s, seq))]
-            results.append({
-                'section': section_name,
-                'subgroup': group_label,
-                'type': label,
-                'pattern': seq,
-                'occurrences': support,
-                'avg_price': matched['avg_price'].mean(),
-                'common_time_of_day': matched['time_of_day'].mode().iloc[0] if not matched['time_of_day'].empty else None,
-                'avg_duration_sec': matched['duration_sec'].mean()
-            })
-
-    return results
-
-final_results = []
+    mining_sequences = group_sequences.collapse_repeats() if collapse_repeats else group_sequences
+    if sample_fraction is None:
+        with instrument.stage('prefixspan', rows_in=len(mining_sequences)) as stage:
+            candidates = [
+                (label, support, seq, rank < TOP_K)
+                for (label, _, _), variant_patterns in zip(PREFIXSPAN_VARIANTS, extract_patterns(mining_sequences, k=candidate_k))
+                for rank, (support, seq) in enumerate(variant_patterns)
+            ]
+            stage.rows_out = len(candidates)
+        mined = [(label, support, seq) for label, support, seq, top in candidates if top]
+        candidates = [(label, seq) for label, _, seq, _ in candidates]
+
+        # One walk over the sessions tests every mined pattern at once
+        with instrument.stage('match_patterns', rows_in=len(mining_sequences)):
+            membership = patterns.match_subsequences(mining_sequences, [seq for _, _, seq in mined])
+        bounds = [{}] * len(mined)
+    else:
+        candidates, mined, membership, bounds = sampled_patterns(mining_sequences, sample_fraction, max(candidate_k, CANDIDATE_K))
+
+    for (label, support, seq), stats, row_bounds in zip(mined, patterns.membership_stats(membership, group_sessions), bounds):
+        results.append({
+            'section': section_name,
+            'subgroup': group_label,
+            'type': label,
+            'pattern': seq,
+            'occurrences': support,
+            **stats,
+            **row_bounds
+        })
 
-for price in session_df['price_chunk'].dropna().unique():
-    subset = session_df[session_df['price_chunk'] == price]
-    final_results.extend(analyze_section(price, subset, 'price_chunk'))
+    return results, candidates
 
-for category in session_df['main_category'].dropna().unique():
-    subset = session_df[session_df['main_category'] == category]
-    final_results.extend(analyze_section(category, subset, 'main_category'))
+# Cart metrics
+def cart_funnel_counts(session_df, sign=1):
+    # Funnel outcome of every cart session from the first-position columns,
+    # counted per (section, subgroup, outcome, time_of_day) over all sections
+    # at once. With sign = -1/+1 per session the counts are a mergeable delta.
+    is_cart = (session_df['first_cart'] >= 0).to_numpy()
+    cart = session_df[is_cart]
+    outcome = np.select(
+        [cart['first_purchase'] > cart['first_cart'], cart['first_remove'] > cart['first_cart']],
+        ['purchase', 'remove'],
+        'abandon'
+    )
+    funnel = pd.concat([
+        pd.DataFrame({
+            'section': section,
+            'subgroup': cart[section].astype(object).to_numpy(),
+            'outcome': outcome,
+            'time_of_day': cart['time_of_day'].astype(object).to_numpy(),
+            'n': np.broadcast_to(np.asarray(sign), len(session_df))[is_cart]
+        })
+        for section in SECTIONS
+    ], ignore_index=True)
+    return funnel.groupby(['section', 'subgroup', 'outcome', 'time_of_day'])['n'].sum().reset_index()
 
-for tod in session_df['time_of_day'].dropna().unique():
-    subset = session_df[session_df['time_of_day'] == tod]
-    final_results.extend(analyze_section(tod, subset, 'time_of_day'))
+def calculate_cart_metrics(funnel, subgroups):
+    # Rows follow `subgroups`
+    funnel = funnel[funnel['n'] > 0]
+    counts = funnel.groupby(['section', 'subgroup', 'outcome'])['n'].sum().unstack('outcome', fill_value=0)
+    counts = counts.reindex(columns=['abandon', 'remove', 'purchase'], fill_value=0)
 
-results_df = pd.DataFrame(final_results)
-results_df.to_csv(os.path.join(output_folder, 'deep_dive_patterns.csv'), index=False)
-print(f"\nAll deep dive patterns saved!")
+    # Modal time per outcome; ties go to the alphabetically first value
+    times = funnel.sort_values(['section', 'subgroup', 'outcome', 'n', 'time_of_day'], ascending=[True, True, True, False, True])
+    times = times.drop_duplicates(['section', 'subgroup', 'outcome']).set_index(['section', 'subgroup', 'outcome'])['time_of_day']
 
-# Cart metrics
-def calculate_cart_metrics(group_label, group_sessions, section_name):
-    cart_sessions = group_sessions[group_sessions['session_sequence'].apply(lambda seq: 'cart' in seq)]
+    results = []
+    for section_name, group_label in subgroups:
+        if (section_name, group_label) not in counts.index:
+            results.append({
+                'section': section_name,
+                'subgroup': group_label,
+                'cart_sessions': 0,
+                'cart_abandonment_rate': None,
+                'cart_to_remove_rate': None,
+                'cart_to_purchase_rate': None,
+                'most_common_time_purchase': None,
+                'most_common_time_remove': None
+            })
+            continue
 
-    if len(cart_sessions) == 0:
-        return {
+        row = counts.loc[(section_name, group_label)]
+        total = row.sum()
+        results.append({
             'section': section_name,
             'subgroup': group_label,
-            'cart_sessions': 0,
-            'cart_abandonment_rate': None,
-            'cart_to_remove_rate': None,
-            'cart_to_purchase_rate': None,
-            'most_common_time_purchase': None,
-            'most_common_time_remove': None
-        }
+            'cart_sessions': total,
+            'cart_abandonment_rate': (row['abandon'] / total) * 100,
+            'cart_to_remove_rate': (row['remove'] / total) * 100,
+            'cart_to_purchase_rate': (row['purchase'] / total) * 100,
+            'most_common_time_purchase': times.get((section_name, group_label, 'purchase')),
+            'most_common_time_remove': times.get((section_name, group_label, 'remove'))
+        })
+    return results
 
-    abandon = 0
-    cart_to_remove = 0
-    cart_to_purchase = 0
-    purchase_times = []
-    remove_times = []
-
-    for idx, row in cart_sessions.iterrows():
-        seq = row['session_sequence']
-        if 'purchase' in seq and seq.index('purchase') > seq.index('cart'):
-            cart_to_purchase += 1
-            purchase_times.append(row['time_of_day'])
-        elif 'remove_from_cart' in seq and seq.index('remove_from_cart') > seq.index('cart'):
-            cart_to_remove += 1
-            remove_times.append(row['time_of_day'])
+def analyze_subgroup(session_df, session_sequences, section_name, group_label, collapse_repeats=False, candidate_k=TOP_K, sample_fraction=None):
+    mask = (session_df[section_name] == group_label).to_numpy()
+    return analyze_section(group_label, session_df[mask], session_sequences[mask], section_name, collapse_repeats, candidate_k, sample_fraction)
+
+def refresh_state(meta, pattern_table, funnel_table, deltas):
+    # Merges session deltas (old versions -1, rebuilt versions +1) into the
+    # saved pattern sums and funnel counts
+    for delta_df, delta_sequences in deltas:
+        has_interaction = delta_sequences.contains_any(INTERACTION_EVENTS)
+        delta_df = delta_df[has_interaction].reset_index(drop=True)
+        delta_sequences = delta_sequences[has_interaction]
+        sign = delta_df['sign'].to_numpy()
+
+        candidates = pattern_table.loc[pattern_table['type'] != 'full_session', incremental.KEY_COLUMNS]
+        delta_state = incremental.pattern_state(delta_df, delta_sequences, SECTIONS, candidates, meta['collapse_repeats'], sign)
+        pattern_table = incremental.merge_state(pattern_table, delta_state)
+
+        funnel_table = pd.concat([funnel_table, cart_funnel_counts(delta_df, sign)], ignore_index=True)
+        funnel_table = funnel_table.groupby(['section', 'subgroup', 'outcome', 'time_of_day'])['n'].sum().reset_index()
+
+        known = set(map(tuple, meta['subgroups']))
+        for section in SECTIONS:
+            for label in delta_df.loc[sign > 0, section].dropna().unique():
+                if (section, label) not in known:
+                    meta['subgroups'].append([section, label])
+                    known.add((section, label))
+    return meta, pattern_table, funnel_table
+
+def write_results(final_results, funnel_results):
+    with instrument.stage('write_csv', rows_in=len(final_results) + len(funnel_results)):
+        results_df = pd.DataFrame(final_results)
+        results_df.to_csv(os.path.join(output_folder, 'deep_dive_patterns.csv'), index=False)
+        print(f"\nAll deep dive patterns saved!")
+
+        funnel_df = pd.DataFrame(funnel_results)
+        funnel_df.to_csv(os.path.join(output_folder, 'cart_behavior_metrics.csv'), index=False)
+    print(f"\nBehavioral Metrics saved!")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mine session patterns and cart metrics per subgroup.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="analyze subgroups on a pool of N processes")
+    parser.add_argument('--collapse-repeats', action='store_true',
+                        help="merge consecutive repeated events before PrefixSpan mining")
+    parser.add_argument('--incremental', action='store_true',
+                        help="update the saved pattern counts and funnel tallies from the session "
+                             "deltas of newly added chunks instead of re-mining everything")
+    parser.add_argument('--sample-fraction', type=float, default=None, metavar='FRAC',
+                        help="mine PrefixSpan candidates on a stratified FRAC of each subgroup's sessions, "
+                             "then count them exactly on all sessions; adds occurrences_estimate/low/high columns")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrument.start('analysis')
+    os.makedirs(output_folder, exist_ok=True)
+    session_fingerprint = sessions.refresh_sessions(input_folder, workers=args.workers)
+
+    if args.incremental:
+        saved = incremental.read_state(state_folder)
+        deltas = None
+        if saved is not None and saved[0]['collapse_repeats'] == args.collapse_repeats:
+            deltas = sessions.load_deltas(saved[0]['sessions'])
+        if deltas is not None:
+            print(f"Refreshing saved analysis state with {len(deltas)} session deltas...")
+            with instrument.stage('refresh_state'):
+                meta, pattern_table, funnel_table = refresh_state(*saved, deltas)
+            subgroups = [tuple(subgroup) for subgroup in meta['subgroups']]
+            prefixspan_labels = [label for label, _, _ in PREFIXSPAN_VARIANTS]
+            write_results(
+                incremental.results_from_state(pattern_table, subgroups, prefixspan_labels, TOP_K),
+                calculate_cart_metrics(funnel_table, subgroups)
+            )
+            meta['sessions'] = session_fingerprint
+            incremental.write_state(state_folder, meta, pattern_table, funnel_table)
+            return
+        print("No usable analysis state found; running a full analysis.")
+
+    # Load sessions (built once and cached by sessions.py)
+    session_df, session_sequences = sessions.load_sessions(input_folder, columns=SESSION_COLUMNS)
+    print(f"Loaded {len(session_df)} sessions.")
+
+    has_interaction = session_sequences.contains_any(INTERACTION_EVENTS)
+    session_df = session_df[has_interaction].reset_index(drop=True)
+    session_sequences = session_sequences[has_interaction]
+
+    # Run analysis
+    candidate_k = CANDIDATE_K if args.incremental else TOP_K
+    subgroups = [(section, label) for section in SECTIONS for label in session_df[section].dropna().unique()]
+    tasks = [(section, label, args.collapse_repeats, candidate_k, args.sample_fraction) for section, label in subgroups]
+    # Stages inside pool workers are not reported; this one covers them
+    with instrument.stage('analyze_subgroups', rows_in=len(session_df)) as stage:
+        if args.workers > 1:
+            subgroup_results = parallel.map_subgroups(analyze_subgroup, session_df, session_sequences, WORKER_COLUMNS, tasks, args.workers)
         else:
-            abandon += 1
-
-    total = len(cart_sessions)
-    return {
-        'section': section_name,
-        'subgroup': group_label,
-        'cart_sessions': total,
-        'cart_abandonment_rate': (abandon / total) * 100,
-        'cart_to_remove_rate': (cart_to_remove / total) * 100,
-        'cart_to_purchase_rate': (cart_to_purchase / total) * 100,
-        'most_common_time_purchase': pd.Series(purchase_times).mode().iloc[0] if purchase_times else None,
-        'most_common_time_remove': pd.Series(remove_times).mode().iloc[0] if remove_times else None
-    }
-
-funnel_results = []
-
-for price in session_df['price_chunk'].dropna().unique():
-    subset = session_df[session_df['price_chunk'] == price]
-    funnel_results.append(calculate_cart_metrics(price, subset, 'price_chunk'))
-
-for category in session_df['main_category'].dropna().unique():
-    subset = session_df[session_df['main_category'] == category]
-    funnel_results.append(calculate_cart_metrics(category, subset, 'main_category'))
-
-for tod in session_df['time_of_day'].dropna().unique():
-    subset = session_df[session_df['time_of_day'] == tod]
-    funnel_results.append(calculate_cart_metrics(tod, subset, 'time_of_day'))
-
-funnel_df = pd.DataFrame(funnel_results)
-funnel_df.to_csv(os.path.join(output_folder, 'cart_behavior_metrics.csv'), index=False)
-print(f"\nBehavioral Metrics saved!")
\ No newline at end of file
+            subgroup_results = [analyze_subgroup(session_df, session_sequences, *task) for task in tasks]
+        final_results = [row for rows, _ in subgroup_results for row in rows]
+        stage.rows_out = len(final_results)
+
+    with instrument.stage('cart_metrics', rows_in=len(session_df)):
+        funnel_table = cart_funnel_counts(session_df)
+        funnel_results = calculate_cart_metrics(funnel_table, subgroups)
+    write_results(final_results, funnel_results)
+
+    if args.incremental:
+        print("Saving analysis state for incremental refreshes...")
+        candidates = pd.DataFrame(
+            [
+                (section, label, pattern_type, PATTERN_SEPARATOR.join(seq))
+                for (section, label), (_, mined) in zip(subgroups, subgroup_results)
+                for pattern_type, seq in mined
+            ],
+            columns=incremental.KEY_COLUMNS
+        )
+        with instrument.stage('save_state', rows_in=len(session_df)):
+            pattern_table = incremental.pattern_state(session_df, session_sequences, SECTIONS, candidates, args.collapse_repeats)
+        meta = {
+            'sessions': session_fingerprint,
+            'collapse_repeats': args.collapse_repeats,
+            'subgroups': [[section, label] for section, label in subgroups]
+        }
+        incremental.write_state(state_folder, meta, pattern_table, funnel_table)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['event_time', 'event_type', 'product_id', 'category_id', 'category_code', 'brand', 'price', 'user_id', 'user_session']
+
+CATEGORY_CODES = [
+    'electronics.smartphone', 'electronics.audio.headphone', 'electronics.video.tv',
+    'appliances.kitchen.washer', 'appliances.environment.vacuum', 'computers.notebook',
+    'computers.desktop', 'apparel.shoes', 'furniture.living_room.sofa', 'auto.accessories.player'
+]
+BRANDS = ['samsung', 'apple', 'xiaomi', 'huawei', 'lg', 'sony', 'lenovo', 'bosch', 'acer', 'oppo']
+START = pd.Timestamp('2019-10-01', tz='UTC')
+
+
+def _session_ids(rng, n):
+    # Random UUID-formatted session ids
+    hex_ids = [f'{a:016x}{b:016x}' for a, b in zip(rng.integers(0, 2**63, n), rng.integers(0, 2**63, n))]
+    return np.array([f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}' for h in hex_ids], dtype=object)
+
+
+def _catalog(rng, n_products, missing_category, missing_brand):
+    # Fixed attributes per product: category, brand and base price
+    category = rng.integers(0, len(CATEGORY_CODES), n_products)
+    brand = rng.integers(0, len(BRANDS), n_products)
+    return pd.DataFrame({
+        'product_id': 1_000_000 + np.arange(n_products),
+        'category_id': 2_053_013_555_631_882_655 + category,
+        'category_code': np.where(rng.random(n_products) < missing_category, None, np.array(CATEGORY_CODES, dtype=object)[category]),
+        'brand': np.where(rng.random(n_products) < missing_brand, None, np.array(BRANDS, dtype=object)[brand]),
+        'price': np.round(rng.lognormal(4.5, 1.2, n_products), 2)
+    })
+
+
+def _session_block(rng, catalog, n_sessions, args):
+    # Session lengths follow a geometric distribution with the given mean
+    lengths = np.minimum(rng.geometric(1 / args.mean_length, n_sessions), args.max_length)
+    offsets = np.r_[0, np.cumsum(lengths)]
+    n_events = offsets[-1]
+    session = np.repeat(np.arange(n_sessions), lengths)
+    position = np.arange(n_events) - offsets[session]
+
+    # Funnel: a session may add to cart at a random position, then purchase
+    # and/or remove later on
+    event_type = np.zeros(n_events, dtype=np.int8)
+    cart_at = (rng.random(n_sessions) * lengths).astype(np.int64)
+    has_cart = rng.random(n_sessions) < args.cart_rate
+    for code, rate in ((2, args.remove_rate), (3, args.purchase_rate)):
+        after = cart_at + 1 + (rng.random(n_sessions) * (lengths - cart_at - 1)).astype(np.int64)
+        hit = has_cart & (rng.random(n_sessions) < rate) & (after < lengths)
+        event_type[offsets[:-1][hit] + after[hit]] = code
+    event_type[offsets[:-1][has_cart] + cart_at[has_cart]] = 1
+
+    # Popular products are picked more often (Zipf-like ranks)
+    product = np.minimum(rng.zipf(args.product_skew, n_events) - 1, len(catalog) - 1)
+    start = rng.integers(0, args.days * 86_400, n_sessions)
+    gaps = rng.exponential(args.mean_gap, n_events).astype(np.int64) * (position > 0)
+    seconds = start[session] + np.cumsum(gaps) - np.repeat(np.cumsum(gaps)[offsets[:-1]], lengths)
+
+    events = catalog.iloc[product].reset_index(drop=True)
+    events['event_time'] = (START + pd.to_timedelta(seconds, unit='s')).strftime('%Y-%m-%d %H:%M:%S UTC')
+    events['event_type'] = np.array(['view', 'cart', 'remove_from_cart', 'purchase'], dtype=object)[event_type]
+    events['user_id'] = (500_000_000 + rng.integers(0, args.users, n_sessions))[session]
+    events['user_session'] = _session_ids(rng, n_sessions)[session]
+    return events.sort_values('event_time', kind='stable')[COLUMNS]
+
+
+def generate_events(output, sessions=100_000, seed=0, **options):
+    """Writes a synthetic raw event file with the 2019-Oct.csv schema.
+
+    Sessions are generated in blocks of `block_sessions`; events are time
+    ordered within each block. Returns the number of events written.
+    """
+    args = argparse.Namespace(**{**vars(parse_args([])), 'sessions': sessions, 'seed': seed, **options})
+    rng = np.random.default_rng(args.seed)
+    catalog = _catalog(rng, args.products, args.missing_category, args.missing_brand)
+
+    n_events = 0
+    for block_start in range(0, args.sessions, args.block_sessions):
+        events = _session_block(rng, catalog, min(args.block_sessions, args.sessions - block_start), args)
+        events.to_csv(output, index=False, mode='w' if block_start == 0 else 'a', header=block_start == 0)
+        n_events += len(events)
+    return n_events
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw event file for benchmarks.")
+    parser.add_argument('--output', default='synthetic_events.csv')
+    parser.add_argument('--sessions', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--users', type=int, default=50_000)
+    parser.add_argument('--products', type=int, default=20_000)
+    parser.add_argument('--product-skew', type=float, default=1.3, help="Zipf exponent of product popularity")
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--mean-length', type=float, default=4.0, help="mean events per session (geometric)")
+    parser.add_argument('--max-length', type=int, default=500)
+    parser.add_argument('--mean-gap', type=float, default=60.0, help="mean seconds between events of a session")
+    parser.add_argument('--cart-rate', type=float, default=0.15, help="share of sessions with a cart event")
+    parser.add_argument('--purchase-rate', type=float, default=0.4, help="share of cart sessions that purchase later")
+    parser.add_argument('--remove-rate', type=float, default=0.2, help="share of cart sessions that remove later")
+    parser.add_argument('--missing-category', type=float, default=0.3)
+    parser.add_argument('--missing-brand', type=float, default=0.15)
+    parser.add_argument('--block-sessions', type=int, default=500_000)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    options = {k: v for k, v in vars(args).items() if k not in ('output', 'sessions', 'seed')}
+    n_events = generate_events(args.output, args.sessions, args.seed, **options)
+    print(f"Wrote {n_events:,} events for {args.sessions:,} sessions to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import runpy
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_events import generate_events
+
+SCALES = [10_000, 100_000]
+EVENTS_FILE = 'events.csv'
+# analyze_section in sampling mode, timed against the exact mode
+SAMPLE_FRACTION = 0.1
+
+
+def _script(name, *argv):
+    # Runs a pipeline script as __main__ with its own command line
+    def run():
+        sys.argv = [name, *argv]
+        runpy.run_path(os.path.join(REPO, name), run_name='__main__')
+    return None, lambda _: run()
+
+
+def _interaction_sessions():
+    import sessions
+    from sequences import INTERACTION_EVENTS
+    session_df, sequences = sessions.load_sessions()
+    has_interaction = sequences.contains_any(INTERACTION_EVENTS)
+    return session_df[has_interaction].reset_index(drop=True), sequences[has_interaction]
+
+
+def _cleaning():
+    import cleaning
+    def run(_):
+        sys.argv = ['cleaning.py', '--input', EVENTS_FILE]
+        cleaning.main()
+    return None, run
+
+
+def _sessionization():
+    import sessions
+    return None, lambda _: sessions.refresh_sessions()
+
+
+def _extract_patterns():
+    import analysis
+    return _interaction_sessions, lambda data: analysis.extract_patterns(data[1])
+
+
+def _analyze_section():
+    # The whole interaction set as one subgroup: the worst case per section
+    import analysis
+    return _interaction_sessions, lambda data: analysis.analyze_section('all', data[0], data[1], 'all')
+
+
+def _analyze_section_sampled():
+    import analysis
+    return _interaction_sessions, lambda data: analysis.analyze_section('all', data[0], data[1], 'all', sample_fraction=SAMPLE_FRACTION)
+
+
+def _calculate_cart_metrics():
+    import analysis
+    def run(data):
+        session_df = data[0]
+        subgroups = [(section, label) for section in analysis.SECTIONS for label in session_df[section].dropna().unique()]
+        return analysis.calculate_cart_metrics(analysis.cart_funnel_counts(session_df), subgroups)
+    return _interaction_sessions, run
+
+
+# (faster variant, reference stage) pairs reported as a speedup
+COMPARISONS = [('analyze_section_sampled', 'analyze_section')]
+
+# Stage name -> factory returning (setup, run). Setup is not timed; run gets
+# its result. Stages run in this order and later ones read earlier outputs.
+STAGES = {
+    'cleaning': _cleaning,
+    'sessionization': _sessionization,
+    'extract_patterns': _extract_patterns,
+    'analyze_section': _analyze_section,
+    'analyze_section_sampled': _analyze_section_sampled,
+    'calculate_cart_metrics': _calculate_cart_metrics,
+    'analysis.py': lambda: _script('analysis.py'),
+    'session_analysis.py': lambda: _script('session_analysis.py'),
+    'understand_session.py': lambda: _script('understand_session.py'),
+    'understand_patterns.py': lambda: _script('understand_patterns.py'),
+    'extra.py': lambda: _script('extra.py'),
+}
+
+
+def _run_stage(stage, workdir, verbose, results):
+    # Runs in a fresh process, started from the lean harness, so its memory
+    # belongs to this stage alone. The high-water mark is reset after setup
+    # (see instrument.reset_peak_rss); stage resets inside the run are
+    # folded into the open benchmark stage.
+    os.chdir(workdir)
+    sys.path.insert(0, REPO)
+    import instrument
+    output = sys.stdout if verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            setup, run = STAGES[stage]()
+            data = setup() if setup else None
+            rss_before = instrument.current_rss_mb()
+            instrument.reset_peak_rss()
+            start = time.perf_counter()
+            with instrument.stage('benchmark') as record:
+                record.discard = True
+                run(data)
+            seconds = time.perf_counter() - start
+        results.put({'seconds': seconds, 'peak_rss_mb': record.peak_rss_mb, 'stage_rss_mb': record.peak_rss_mb - rss_before})
+    except (Exception, SystemExit) as exc:
+        results.put({'error': f'{type(exc).__name__}: {exc}'})
+
+
+def _in_process(target, *args):
+    # Result of target(*args, queue) run in a spawned process
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=target, args=(*args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def run_stage(stage, workdir, verbose=False):
+    return _in_process(_run_stage, stage, workdir, verbose)
+
+
+def _generate(path, sessions, seed, results):
+    results.put(generate_events(path, sessions, seed))
+
+
+def run_scale(sessions, stages, workdir, seed=0, verbose=False):
+    os.makedirs(workdir, exist_ok=True)
+    print(f"\n=== {sessions:,} sessions ({workdir}) ===")
+    start = time.perf_counter()
+    # In its own process: children inherit the parent's ru_maxrss, so the
+    # harness never holds the generator's memory
+    events = _in_process(_generate, os.path.join(workdir, EVENTS_FILE), sessions, seed)
+    print(f"Generated {events:,} events in {time.perf_counter() - start:.1f}s")
+
+    rows = []
+    for stage in stages:
+        result = run_stage(stage, workdir, verbose)
+        rows.append({'sessions': sessions, 'events': events, 'stage': stage, **result})
+        if 'error' in result:
+            print(f"{stage:<24} FAILED {result['error']}")
+        else:
+            print(f"{stage:<24} {result['seconds']:>9.2f}s  peak {result['peak_rss_mb']:>8.1f} MB  (+{result['stage_rss_mb']:.1f} MB in stage)")
+
+    seconds = {row['stage']: row['seconds'] for row in rows if 'seconds' in row}
+    for variant, reference in COMPARISONS:
+        if variant in seconds and reference in seconds:
+            print(f"{variant} vs {reference}: {seconds[reference] / seconds[variant]:.2f}x faster")
+    return rows
+
+
+def compare(rows, baseline_rows, tolerance):
+    # Stages that got slower than the baseline by more than `tolerance`
+    baseline = {(row['sessions'], row['stage']): row for row in baseline_rows if 'seconds' in row}
+    regressions = []
+    for row in rows:
+        old = baseline.get((row['sessions'], row['stage']))
+        if old and 'seconds' in row and row['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append((row['sessions'], row['stage'], old['seconds'], row['seconds']))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Time and memory-profile the pipeline on synthetic data.")
+    parser.add_argument('--sessions', type=int, nargs='+', default=SCALES, help="scales to run, in sessions")
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=list(STAGES))
+    parser.add_argument('--workdir', default=None, help="keep generated data and outputs here")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown against the baseline")
+    parser.add_argument('--verbose', action='store_true', help="show the output of every stage")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stages = [stage for stage in STAGES if stage in args.stages]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for sessions in args.sessions:
+            workdir = os.path.join(args.workdir or tmp, f'sessions_{sessions}')
+            rows += run_scale(sessions, stages, workdir, args.seed, args.verbose)
+
+    with open(args.output, 'w') as f:
+        json.dump(rows, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rows, json.load(f), args.tolerance)
+        for sessions, stage, old, new in regressions:
+            print(f"REGRESSION {stage} at {sessions:,} sessions: {old:.2f}s -> {new:.2f}s")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,75 +1,233 @@
+import argparse
 import pandas as pd
 import numpy as np
 import os
-
-input_file = '2019-Oct.csv'  
-output_folder = './split_data'  
-os.makedirs(output_folder, exist_ok=True)
-
-def price_group(price, low_thresh, high_thresh):
-    if price <= low_thresh:
-        return 'Low'
-    elif price <= high_thresh:
-        return 'Medium'
-    else:
-        return 'High'  
-
-def time_of_day(hour):
-    if 5 <= hour < 12:
-        return 'Morning'
-    elif 12 <= hour < 18:
-        return 'Afternoon'
-    else:
-        return 'Night'
-
-# Estimate global price thresholds
-print("Estimating global price thresholds...")
-
-price_values = pd.read_csv(input_file, usecols=['price'], chunksize=500_000)
-
-all_prices = []
-for chunk in price_values:
-    all_prices.extend(chunk['price'].dropna().tolist())
-
-all_prices = pd.Series(all_prices)
-low_thresh, high_thresh = all_prices.quantile([0.33, 0.66]).values
-
-print(f"Global price thresholds:")
-print(f"- Low <= {low_thresh:.2f}")
-print(f"- Medium <= {high_thresh:.2f}")
-print(f"- High > {high_thresh:.2f}")
-
-print("Processing...")
-
-reader = pd.read_csv(input_file, chunksize=500_000)
-for i, chunk in enumerate(reader):
-    print(f"\nProcessing chunk {i+1}...")
-
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import dimensions
+import features
+import instrument
+import storage
+from sketches import KLLSketch
+
+CHUNK_SIZE = 500_000
+PRICE_QUANTILES = [0.33, 0.66]
+# Chunks are split into this many session hash buckets, so sessions can be
+# built one bucket at a time instead of from the whole month in memory
+SESSION_BUCKETS = 32
+
+def exact_price_thresholds(input_files, chunk_size=CHUNK_SIZE):
+    # Exact quantiles (linear interpolation, like Series.quantile) from the
+    # count of every distinct price, merged chunk by chunk. Prices are in
+    # cents, so memory grows with the distinct prices, not the rows.
+    values, counts = np.empty(0), np.empty(0, dtype=np.int64)
+    for input_file in input_files:
+        for chunk in pd.read_csv(input_file, usecols=['price'], chunksize=chunk_size):
+            chunk_values, chunk_counts = np.unique(chunk['price'].dropna().to_numpy(dtype=np.float64), return_counts=True)
+            values, inverse = np.unique(np.concatenate([values, chunk_values]), return_inverse=True)
+            merged = np.zeros(len(values), dtype=np.int64)
+            np.add.at(merged, inverse, np.concatenate([counts, chunk_counts]))
+            counts = merged
+
+    cumulative = np.cumsum(counts)
+    thresholds = []
+    for q in PRICE_QUANTILES:
+        position = (cumulative[-1] - 1) * q
+        below = np.floor(position)
+        ranks = np.array([below, min(below + 1, cumulative[-1] - 1)])
+        neighbours = values[np.searchsorted(cumulative, ranks, side='right')]
+        # the same interpolation as a quantile over every price
+        thresholds.append(float(np.quantile(neighbours, position - below)))
+    return tuple(thresholds)
+
+def estimate_price_thresholds(input_files, sample_frac=None, seed=0, chunk_size=CHUNK_SIZE):
+    # Streams the price column through a quantile sketch, so memory stays
+    # constant regardless of file size. With sample_frac only a random
+    # fraction of the rows is parsed at all. The thresholds are approximate
+    # and can move price_chunk labels, and so the analysis results, slightly.
+    skiprows = None
+    if sample_frac is not None:
+        rng = np.random.default_rng(seed)
+        skiprows = lambda i: i > 0 and rng.random() >= sample_frac
+
+    sketch = KLLSketch(seed=seed)
+    for input_file in input_files:
+        for chunk in pd.read_csv(input_file, usecols=['price'], chunksize=chunk_size, skiprows=skiprows):
+            sketch.update(chunk['price'].to_numpy())
+
+    low_thresh, high_thresh = sketch.quantile(PRICE_QUANTILES)
+    return float(low_thresh), float(high_thresh)
+
+def clean_chunk(chunk, low_thresh, high_thresh):
     # Remove any rows with missing values (any column)
-    chunk.dropna(inplace=True)
+    with instrument.stage('dropna', rows_in=len(chunk)) as stage:
+        chunk.dropna(inplace=True)
+        stage.rows_out = len(chunk)
 
     # Convert event_time to datetime
-    chunk['event_time'] = pd.to_datetime(chunk['event_time'], errors='coerce')
-    chunk.dropna(subset=['event_time'], inplace=True)
-
-    # Create price_chunk column (using GLOBAL thresholds)
-    chunk['price_chunk'] = chunk['price'].apply(lambda x: price_group(x, low_thresh, high_thresh))
-    
-    # Create main_category column
-    chunk['main_category'] = chunk['category_code'].apply(lambda x: str(x).split('.')[0] if pd.notnull(x) else None)
-
-    # Create time_of_day column
-    chunk['event_hour'] = chunk['event_time'].dt.hour
-    chunk['time_of_day'] = chunk['event_hour'].apply(time_of_day)
-
-    # Save the processed chunk
-    output_file = os.path.join(output_folder, f'chunk_{i+1}.csv')
-    chunk.to_csv(output_file, index=False)
-    print(f"Saved {output_file} with {len(chunk)} rows.")
-
-    # STOP after 38 chunks (controlled amount of data)
-    if i+1 == 150:
-        print("\nStopping after 150 chunks!")
-        break
-
-print("\nCleaning complete!")
+    with instrument.stage('to_datetime', rows_in=len(chunk)) as stage:
+        chunk['event_time'] = pd.to_datetime(chunk['event_time'], errors='coerce')
+        chunk.dropna(subset=['event_time'], inplace=True)
+        stage.rows_out = len(chunk)
+
+    with instrument.stage('features', rows_in=len(chunk)):
+        # Create price_chunk column (using GLOBAL thresholds)
+        chunk['price_chunk'] = features.price_chunk(chunk['price'], low_thresh, high_thresh)
+
+        # Create main_category column
+        chunk['main_category'] = features.main_category(chunk['category_code'])
+
+        # Create time_of_day column
+        chunk['event_hour'] = chunk['event_time'].dt.hour
+        chunk['time_of_day'] = features.time_of_day(chunk['event_time'])
+
+    # Declared column types, shared by the chunk files and the dimension indexes
+    return storage.apply_schema(chunk)
+
+def process_chunk(chunk, low_thresh, high_thresh, output_folder, chunk_number, buckets):
+    # Clean one raw chunk and write its file(s); runs in a pool worker in
+    # parallel mode, so only the counts and the small dimension partials
+    # travel back
+    chunk = clean_chunk(chunk, low_thresh, high_thresh)
+    with instrument.stage('write_chunk', rows_in=len(chunk)):
+        output_files = storage.write_chunk(chunk, output_folder, chunk_number, buckets)
+    with instrument.stage('chunk_dimensions', rows_in=len(chunk)):
+        dims = dimensions.chunk_dimensions(chunk)
+    return chunk_number, len(chunk), len(output_files), dims
+
+def report_chunk(result, dimension_parts):
+    chunk_number, rows, files, dims = result
+    dimensions.add_part(dimension_parts, dims)
+    print(f"Saved chunk {chunk_number} ({files} files) with {rows} rows.")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean raw event files and split them into chunks.")
+    parser.add_argument('--input', nargs='+', default=['2019-Oct.csv'])
+    parser.add_argument('--output', default='./split_data')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--approx-thresholds', action='store_true',
+                        help="estimate price thresholds with a constant-memory quantile sketch instead of exactly")
+    parser.add_argument('--price-sample', type=float, default=None, metavar='FRAC',
+                        help="estimate price thresholds from a random fraction of the rows (implies --approx-thresholds)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only clean input files not yet recorded in the output manifest, "
+                             "appending chunks and reusing the stored price thresholds")
+    parser.add_argument('--buckets', type=int, default=SESSION_BUCKETS,
+                        help="number of user_session hash buckets per chunk (0 writes unsplit chunks)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="clean chunks on a pool of N processes while this one reads")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="chunks read but not yet written (default 2 per worker); caps memory")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrument.start('cleaning')
+    output_folder = args.output
+    os.makedirs(output_folder, exist_ok=True)
+
+    manifest = storage.read_manifest(output_folder) if args.incremental else None
+    fresh = manifest is None
+    if fresh:
+        # Fresh run: start the chunk numbering over
+        for stale in storage.chunk_files(output_folder):
+            os.remove(stale)
+        dimensions.remove_dimensions(output_folder)
+        manifest = {'thresholds': None, 'buckets': args.buckets, 'next_chunk': 1, 'files': {}}
+    # Appended chunks must use the same partitioning as the existing ones
+    buckets = manifest.get('buckets', 0)
+
+    # A known file whose size or mtime changed is re-hashed: a touched file
+    # is skipped, a rewritten one replaces its old chunks. The replaced rows
+    # are still in the saved dimension indexes, so those are rebuilt (the
+    # manifest remembers this in case the run stops before then).
+    input_files = []
+    for input_file in args.input:
+        name = os.path.basename(input_file)
+        entry = manifest['files'].get(name)
+        if entry is None:
+            input_files.append(input_file)
+        elif entry['signature'] != storage.file_signature(input_file):
+            if entry.get('sha1') == storage.file_digest(input_file):
+                entry['signature'] = storage.file_signature(input_file)
+                continue
+            print(f"{name} changed since it was cleaned; replacing its chunks {entry['chunks'][0]}-{entry['chunks'][1]}...")
+            storage.remove_chunks(output_folder, *entry['chunks'])
+            del manifest['files'][name]
+            input_files.append(input_file)
+            manifest['rebuild_dimensions'] = True
+    storage.write_manifest(output_folder, manifest)
+    if not input_files:
+        print("No new input files to clean.")
+        return
+
+    if manifest['thresholds'] is None:
+        # Global price thresholds
+        with instrument.stage('price_thresholds'):
+            if args.approx_thresholds or args.price_sample is not None:
+                print("Estimating global price thresholds...")
+                manifest['thresholds'] = estimate_price_thresholds(input_files, sample_frac=args.price_sample, chunk_size=args.chunk_size)
+            else:
+                print("Computing global price thresholds...")
+                manifest['thresholds'] = exact_price_thresholds(input_files, chunk_size=args.chunk_size)
+    low_thresh, high_thresh = manifest['thresholds']
+
+    print(f"Global price thresholds:")
+    print(f"- Low <= {low_thresh:.2f}")
+    print(f"- Medium <= {high_thresh:.2f}")
+    print(f"- High > {high_thresh:.2f}")
+
+    print("Processing...")
+
+    # Chunk numbers are assigned in read order, so the output is the same
+    # with any number of workers. Stages inside workers are covered by this one.
+    max_in_flight = args.max_in_flight or 2 * args.workers
+    chunk_number = manifest['next_chunk']
+    dimension_parts = []
+    with instrument.stage('clean_chunks'), (ProcessPoolExecutor(args.workers) if args.workers > 1 else nullcontext()) as pool:
+        in_flight = deque()
+        for input_file in input_files:
+            first_chunk = chunk_number
+            reader = pd.read_csv(input_file, chunksize=args.chunk_size)
+            for chunk in instrument.timed_iter(reader, 'read_chunk'):
+                print(f"\nProcessing chunk {chunk_number}...")
+                task = (chunk, low_thresh, high_thresh, output_folder, chunk_number, buckets)
+                if pool is None:
+                    report_chunk(process_chunk(*task), dimension_parts)
+                else:
+                    # Wait for the oldest chunk before reading past the limit
+                    in_flight.append(pool.submit(process_chunk, *task))
+                    if len(in_flight) >= max_in_flight:
+                        report_chunk(in_flight.popleft().result(), dimension_parts)
+                del chunk, task
+                chunk_number += 1
+
+            # A file is only recorded once all of its chunks are on disk
+            while in_flight:
+                report_chunk(in_flight.popleft().result(), dimension_parts)
+            manifest['files'][os.path.basename(input_file)] = {
+                'signature': storage.file_signature(input_file),
+                'sha1': storage.file_digest(input_file),
+                'chunks': [first_chunk, chunk_number - 1]
+            }
+            manifest['next_chunk'] = chunk_number
+            storage.write_manifest(output_folder, manifest)
+
+    # Product/brand/user indexes for extra.py, merged with the saved ones on
+    # incremental runs (rebuilt from all chunks if there are none yet)
+    print("\nBuilding dimension indexes...")
+    with instrument.stage('dimensions'):
+        rebuild = manifest.pop('rebuild_dimensions', False)
+        existing = None if fresh or rebuild else dimensions.read_dimensions(output_folder)
+        if fresh or existing is not None:
+            dimensions.write_dimensions(output_folder, dimensions.merge_dimensions([existing] + dimension_parts))
+        else:
+            dimensions.build_from_chunks(output_folder)
+    storage.write_manifest(output_folder, manifest)
+
+    print("\nCleaning complete!")
+
+if __name__ == '__main__':
+    main()
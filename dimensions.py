@@ -0,0 +1,195 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import storage
+from sketches import HyperLogLog
+
+DIMENSIONS_FOLDER = '_dims'
+SUMMARY_FILE = 'summary.json'
+DISTINCT_FILE = 'distinct_hll.npz'
+TABLES = ['products', 'brand_categories', 'users', 'user_sessions']
+# Chunk partials are folded into one running merge this often, so memory
+# follows the distinct keys instead of the rows cleaned so far
+MERGE_EVERY = 8
+# Distinct counts that also get a HyperLogLog estimate
+DISTINCT_COLUMNS = ['user_id', 'user_session', 'product_id', 'brand']
+
+PRODUCT_AGGREGATES = {
+    'brand': 'first', 'main_category': 'first', 'category_code': 'first',
+    'n_events': 'sum', 'price_sum': 'sum', 'price_min': 'min', 'price_max': 'max'
+}
+
+
+def dimensions_folder(input_folder):
+    return os.path.join(input_folder, DIMENSIONS_FOLDER)
+
+
+def chunk_dimensions(chunk):
+    """Mergeable partial indexes of one cleaned chunk.
+
+    products: product_id -> brand, category and price sums; brand_categories:
+    (brand, main_category) -> events; users: user_id -> events;
+    user_sessions: sorted distinct (user_id, 64-bit session id hash) pairs,
+    so session counts stay exact for sessions spanning chunks.
+    """
+    events = pd.DataFrame({
+        'product_id': chunk['product_id'].to_numpy(),
+        'brand': chunk['brand'].astype(object).to_numpy(),
+        'main_category': chunk['main_category'].astype(object).to_numpy(),
+        'category_code': chunk['category_code'].astype(object).to_numpy(),
+        'price': storage.price_values(chunk['price']).to_numpy(),
+        'user_id': chunk['user_id'].to_numpy(),
+    })
+    products = events.groupby('product_id').agg(
+        brand=('brand', 'first'),
+        main_category=('main_category', 'first'),
+        category_code=('category_code', 'first'),
+        n_events=('price', 'size'),
+        price_sum=('price', 'sum'),
+        price_min=('price', 'min'),
+        price_max=('price', 'max'),
+    ).reset_index()
+    user_sessions = pd.DataFrame({
+        'user_id': events['user_id'],
+        'session_hash': pd.util.hash_pandas_object(chunk['user_session'].astype(str), index=False).to_numpy()
+    })
+
+    return {
+        'products': products,
+        'brand_categories': events.groupby(['brand', 'main_category']).size().rename('n_events').reset_index(),
+        'users': events.groupby('user_id').size().rename('n_events').reset_index(),
+        'user_sessions': distinct_pairs(user_sessions),
+        'event_types': {str(k): int(v) for k, v in chunk['event_type'].value_counts().items()},
+        'distinct': {col: HyperLogLog().update(chunk[col].astype(object)) for col in DISTINCT_COLUMNS}
+    }
+
+
+def distinct_pairs(user_sessions):
+    return user_sessions.drop_duplicates().sort_values(['user_id', 'session_hash'], ignore_index=True)
+
+
+def merge_dimensions(parts):
+    parts = [part for part in parts if part is not None]
+    event_types, distinct = {}, {}
+    for part in parts:
+        for event, n in part['event_types'].items():
+            event_types[event] = event_types.get(event, 0) + n
+        for col, sketch in part['distinct'].items():
+            distinct[col] = distinct[col].merge(sketch) if col in distinct else sketch
+
+    def stacked(name):
+        return pd.concat([part[name] for part in parts], ignore_index=True)
+
+    return {
+        'products': stacked('products').groupby('product_id').agg(PRODUCT_AGGREGATES).reset_index(),
+        'brand_categories': stacked('brand_categories').groupby(['brand', 'main_category'])['n_events'].sum().reset_index(),
+        'users': stacked('users').groupby('user_id')['n_events'].sum().reset_index(),
+        'user_sessions': distinct_pairs(stacked('user_sessions')),
+        'event_types': event_types,
+        'distinct': distinct
+    }
+
+
+def write_dimensions(input_folder, dims):
+    # Brands become integer ids; brands.parquet is their dictionary
+    folder = dimensions_folder(input_folder)
+    os.makedirs(folder, exist_ok=True)
+    brand_names = sorted(set(dims['products']['brand'].dropna()) | set(dims['brand_categories']['brand']))
+    brand_ids = pd.Series(np.arange(len(brand_names), dtype=np.int32), index=brand_names)
+
+    products = dims['products'].assign(brand_id=dims['products']['brand'].map(brand_ids).astype('Int32'))
+    products['avg_price'] = products['price_sum'] / products['n_events']
+    brand_categories = dims['brand_categories'].assign(brand_id=dims['brand_categories']['brand'].map(brand_ids).astype(np.int32))
+    users = dims['users'].merge(
+        dims['user_sessions'].groupby('user_id').size().rename('n_sessions').reset_index(), on='user_id', how='left'
+    )
+    brands = pd.DataFrame({
+        'brand_id': brand_ids.to_numpy(),
+        'brand': brand_names,
+        'n_events': brand_categories.groupby('brand_id')['n_events'].sum().reindex(brand_ids.to_numpy(), fill_value=0).to_numpy(),
+        'n_products': products.groupby('brand_id').size().reindex(brand_ids.to_numpy(), fill_value=0).to_numpy(),
+    })
+
+    tables = {
+        'products': products.drop(columns='brand').astype({'main_category': 'category', 'category_code': 'category'}),
+        'brands': brands,
+        'brand_categories': brand_categories.drop(columns='brand').astype({'main_category': 'category'}),
+        'users': users,
+        'user_sessions': dims['user_sessions'],
+    }
+    for name, table in tables.items():
+        table.to_parquet(os.path.join(folder, f'{name}.parquet'), index=False)
+
+    summary = {
+        'total_events': int(sum(dims['event_types'].values())),
+        'event_types': dims['event_types'],
+        'distinct': {
+            'user_id': len(users),
+            'user_session': int(dims['user_sessions']['session_hash'].nunique()),
+            'product_id': len(products),
+            'brand': len(brand_names)
+        },
+        'distinct_estimates': {col: sketch.estimate() for col, sketch in dims['distinct'].items()}
+    }
+    with open(os.path.join(folder, SUMMARY_FILE), 'w') as f:
+        json.dump(summary, f, indent=2)
+    np.savez(os.path.join(folder, DISTINCT_FILE), **{col: sketch.registers for col, sketch in dims['distinct'].items()})
+    return summary
+
+
+def read_dimensions(input_folder, tables=TABLES):
+    """The saved indexes in their mergeable form (brands as names), or None."""
+    folder = dimensions_folder(input_folder)
+    # (indexes written without user_sessions count as missing)
+    if not all(os.path.exists(os.path.join(folder, name)) for name in [SUMMARY_FILE, 'user_sessions.parquet']):
+        return None
+    with open(os.path.join(folder, SUMMARY_FILE)) as f:
+        summary = json.load(f)
+    brands = pd.read_parquet(os.path.join(folder, 'brands.parquet'))
+    brand_names = brands.set_index('brand_id')['brand']
+
+    dims = {'summary': summary, 'brands': brands, 'event_types': summary['event_types'], 'distinct': {}}
+    with np.load(os.path.join(folder, DISTINCT_FILE)) as registers:
+        for col in registers.files:
+            sketch = HyperLogLog()
+            sketch.registers = registers[col]
+            dims['distinct'][col] = sketch
+    for name in tables:
+        table = pd.read_parquet(os.path.join(folder, f'{name}.parquet'))
+        for col in table.select_dtypes('category'):
+            table[col] = table[col].astype(object)
+        if 'brand_id' in table:
+            table.insert(1, 'brand', table.pop('brand_id').map(brand_names))
+        dims[name] = table.drop(columns=['avg_price', 'n_sessions'], errors='ignore')
+    return dims
+
+
+def remove_dimensions(input_folder):
+    for stale in glob.glob(os.path.join(dimensions_folder(input_folder), '*')):
+        os.remove(stale)
+
+
+def add_part(parts, part):
+    # Appends a chunk partial, folding the list into one merge every
+    # MERGE_EVERY parts
+    parts.append(part)
+    if len(parts) > MERGE_EVERY:
+        parts[:] = [merge_dimensions(parts)]
+
+
+def build_from_chunks(input_folder):
+    # Rebuilds the indexes from already cleaned chunks, one file at a time
+    columns = ['event_type', 'product_id', 'brand', 'main_category', 'category_code', 'price', 'user_id', 'user_session']
+    parts = []
+    for path in storage.chunk_files(input_folder):
+        add_part(parts, chunk_dimensions(storage.read_events(input_folder, columns=columns, files=[path])))
+    return write_dimensions(input_folder, merge_dimensions(parts))
+
+
+if __name__ == '__main__':
+    summary = build_from_chunks('./split_data')
+    print(f"Built dimension indexes for {summary['total_events']:,} events.")
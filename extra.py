@@ -1,35 +1,30 @@
-import pandas as pd
-import os
+import dimensions
+import instrument
 
 input_folder = './split_data'
-chunk_files = sorted([f for f in os.listdir(input_folder) if f.endswith('.csv')])
-
-print("Loading all chunks...")
-dfs = [pd.read_csv(os.path.join(input_folder, f), low_memory=False) for f in chunk_files]
-df = pd.concat(dfs, ignore_index=True)
-print(f"Loaded {len(df):,} total events.")
-
-total_events = len(df)
-unique_users = df['user_id'].nunique()
-unique_sessions = df['user_session'].nunique()
-event_dist = df['event_type'].value_counts(normalize=True).round(4) * 100
-event_dist = event_dist.to_dict()
+# Print HyperLogLog estimates instead of the exact distinct counts
+DISTINCT_ESTIMATES = False
+instrument.start('extra')
+
+# Dataset summary from the dimension indexes written by cleaning.py
+with instrument.stage('read_dimensions'):
+    dims = dimensions.read_dimensions(input_folder, tables=['brand_categories'])
+    if dims is None:
+        print("No dimension indexes found; building them from the cleaned chunks...")
+        dimensions.build_from_chunks(input_folder)
+        dims = dimensions.read_dimensions(input_folder, tables=['brand_categories'])
+summary = dims['summary']
+distinct = summary['distinct_estimates'] if DISTINCT_ESTIMATES else summary['distinct']
+
+total_events = summary['total_events']
+unique_users = distinct['user_id']
+unique_sessions = distinct['user_session']
+event_counts = sorted(summary['event_types'].items(), key=lambda item: -item[1])
+event_dist = {event: round(n / total_events, 4) * 100 for event, n in event_counts}
 
 # brand
-num_unique_brands = df['brand'].nunique()
-brand_category_map = df.dropna(subset=['brand', 'main_category'])[['brand', 'main_category']].drop_duplicates()
-
-# sessions
-df['event_time'] = pd.to_datetime(df['event_time'], utc=True)
-
-session_stats = df.groupby('user_session').agg({
-    'event_time': [min, max],
-    'product_id': pd.Series.nunique,
-    'brand': pd.Series.nunique
-}).reset_index()
-
-session_stats.columns = ['user_session', 'start_time', 'end_time', 'unique_products', 'unique_brands']
-session_stats['session_duration_sec'] = (session_stats['end_time'] - session_stats['start_time']).dt.total_seconds()
+num_unique_brands = distinct['brand']
+brand_category_map = dims['brand_categories'][['brand', 'main_category']]
 
 # summary
 print("\n--- Dataset Summary ---")
@@ -43,5 +38,6 @@ for k, v in event_dist.items():
     print(f" - {k}: {v:.2f}%")
 
 # save breakdowns
-brand_category_map.to_csv("brand_maincategory_map.csv", index=False)
-print("\nSaved session_analysis.csv and brand_maincategory_map.csv")
\ No newline at end of file
+with instrument.stage('write_csv', rows_in=len(brand_category_map)):
+    brand_category_map.to_csv("brand_maincategory_map.csv", index=False)
+print("\nSaved brand_maincategory_map.csv")
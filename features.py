@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+PRICE_CHUNKS = ['Low', 'Medium', 'High']
+TIMES_OF_DAY = ['Morning', 'Afternoon', 'Evening', 'Night']
+
+# hour -> index into TIMES_OF_DAY
+# Morning 5-11, Afternoon 12-16, Evening 17-21, Night 22-4
+HOUR_TO_TIME_OF_DAY = np.array([3] * 5 + [0] * 7 + [1] * 5 + [2] * 5 + [3] * 2, dtype=np.int8)
+
+
+def price_chunk(price, low_thresh, high_thresh):
+    values = price.to_numpy()
+    codes = np.select([values <= low_thresh, values <= high_thresh], [0, 1], 2).astype(np.int8)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=PRICE_CHUNKS), index=price.index)
+
+
+def time_of_day(event_time):
+    hour = event_time.dt.hour
+    missing = hour.isna().to_numpy()
+    codes = HOUR_TO_TIME_OF_DAY[hour.fillna(0).to_numpy(dtype=np.int64)]
+    codes[missing] = -1
+    return pd.Series(pd.Categorical.from_codes(codes, categories=TIMES_OF_DAY), index=event_time.index)
+
+
+def main_category(category_code):
+    # Split each distinct category_code once instead of once per row
+    codes, uniques = pd.factorize(category_code)
+    mains = pd.Index(uniques.astype(str)).str.split('.').str[0]
+    categories = pd.Index(mains.unique()).sort_values()
+    lookup = np.append(categories.get_indexer(mains), -1)
+    return pd.Series(pd.Categorical.from_codes(lookup[codes], categories=categories), index=category_code.index)
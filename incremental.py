@@ -0,0 +1,141 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import patterns
+from features import TIMES_OF_DAY
+from sequences import PATTERN_SEPARATOR
+
+STATE_FILE = 'state.json'
+PATTERN_STATE_FILE = 'patterns.parquet'
+FUNNEL_STATE_FILE = 'funnel.parquet'
+
+KEY_COLUMNS = ['section', 'subgroup', 'type', 'pattern']
+# modal time of day ties go to the alphabetically first bucket
+TOD_COLUMNS = [f'tod_{tod}' for tod in sorted(TIMES_OF_DAY)]
+SUM_COLUMNS = ['occurrences', 'price_sum', 'duration_sum'] + TOD_COLUMNS
+
+
+def _weighted_sums(session_df, sign):
+    # Per-session contributions to the mergeable pattern sums
+    weight = np.broadcast_to(np.asarray(sign, dtype=np.int64), len(session_df))
+    sums = pd.DataFrame({
+        'occurrences': weight,
+        'price_sum': weight * session_df['avg_price'].to_numpy(dtype=np.float64),
+        'duration_sum': weight * session_df['duration_sec'].to_numpy(dtype=np.float64),
+    })
+    time_of_day = session_df['time_of_day'].astype(object).to_numpy()
+    for col, tod in zip(TOD_COLUMNS, sorted(TIMES_OF_DAY)):
+        sums[col] = np.where(time_of_day == tod, weight, 0)
+    return sums, weight
+
+
+def _aggregate(frame):
+    return frame.groupby(KEY_COLUMNS, sort=False).agg(
+        {**{col: 'sum' for col in SUM_COLUMNS}, 'first_session': 'min'}
+    ).reset_index()
+
+
+def pattern_state(session_df, sequences, sections, candidates, collapse_repeats=False, sign=1):
+    """Mergeable sums per (section, subgroup, type, pattern) for these sessions.
+
+    Every distinct full session is counted; PrefixSpan patterns are counted
+    only for the given candidates (a frame with the key columns). `sign` is a
+    scalar or one +1/-1 weight per session, so a session delta yields the
+    state change directly.
+    """
+    sums, weight = _weighted_sums(session_df, sign)
+    strings = sequences.to_strings()
+    first_session = np.where(weight > 0, session_df['user_session'].astype(object).to_numpy(), None)
+
+    frames = []
+    for section in sections:
+        frames.append(_aggregate(sums.assign(
+            section=section,
+            subgroup=session_df[section].astype(object).to_numpy(),
+            type='full_session',
+            pattern=strings,
+            first_session=first_session
+        ).dropna(subset=['subgroup'])))
+
+    for (section, subgroup), group in candidates.groupby(['section', 'subgroup'], sort=False):
+        mask = (session_df[section] == subgroup).to_numpy()
+        if not mask.any():
+            continue
+        group_sequences = sequences[mask]
+        if collapse_repeats:
+            group_sequences = group_sequences.collapse_repeats()
+        unique_patterns = list(dict.fromkeys(group['pattern']))
+        membership = patterns.match_subsequences(group_sequences, [p.split(PATTERN_SEPARATOR) for p in unique_patterns])
+        totals = pd.DataFrame(
+            membership.T.astype(np.float64) @ sums[mask].to_numpy(dtype=np.float64),
+            columns=SUM_COLUMNS,
+            index=unique_patterns
+        )
+        rows = totals.loc[group['pattern']].reset_index(drop=True)
+        frames.append(pd.concat([group[KEY_COLUMNS].reset_index(drop=True), rows], axis=1).assign(first_session=None))
+
+    state = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=KEY_COLUMNS + SUM_COLUMNS + ['first_session'])
+    return state.astype({col: np.int64 for col in SUM_COLUMNS if col not in ('price_sum', 'duration_sum')})
+
+
+def merge_state(state, delta):
+    merged = _aggregate(pd.concat([state, delta], ignore_index=True))
+    # Full sessions whose last occurrence was replaced drop out; candidate
+    # patterns stay even at zero support
+    return merged[(merged['type'] != 'full_session') | (merged['occurrences'] > 0)].reset_index(drop=True)
+
+
+def results_from_state(state, subgroups, prefixspan_labels, top_k):
+    # deep_dive_patterns rows ranked like a full run: full sessions by count
+    # then first occurrence, PrefixSpan patterns by support then pattern.
+    results = []
+    grouped = dict(tuple(state.groupby(['section', 'subgroup'], sort=False)))
+    for section_name, group_label in subgroups:
+        group = grouped.get((section_name, group_label))
+        if group is None:
+            continue
+        for label in ['full_session'] + prefixspan_labels:
+            rows = group[group['type'] == label].to_dict('records')
+            if label == 'full_session':
+                rows.sort(key=lambda row: (-row['occurrences'], row['first_session'] if isinstance(row['first_session'], str) else '\uffff'))
+            else:
+                rows.sort(key=lambda row: (-row['occurrences'], row['pattern'].split(PATTERN_SEPARATOR)))
+            for row in rows[:top_k]:
+                events = row['pattern'].split(PATTERN_SEPARATOR)
+                occurrences = row['occurrences']
+                tod_counts = [row[col] for col in TOD_COLUMNS]
+                results.append({
+                    'section': section_name,
+                    'subgroup': group_label,
+                    'type': label,
+                    'pattern': tuple(events) if label == 'full_session' else events,
+                    'occurrences': occurrences,
+                    'avg_price': row['price_sum'] / occurrences if occurrences else np.nan,
+                    'common_time_of_day': sorted(TIMES_OF_DAY)[int(np.argmax(tod_counts))] if max(tod_counts) > 0 else None,
+                    'avg_duration_sec': row['duration_sum'] / occurrences if occurrences else np.nan
+                })
+    return results
+
+
+def read_state(state_folder):
+    path = os.path.join(state_folder, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    return (
+        meta,
+        pd.read_parquet(os.path.join(state_folder, PATTERN_STATE_FILE)),
+        pd.read_parquet(os.path.join(state_folder, FUNNEL_STATE_FILE))
+    )
+
+
+def write_state(state_folder, meta, pattern_table, funnel_table):
+    os.makedirs(state_folder, exist_ok=True)
+    pattern_table.to_parquet(os.path.join(state_folder, PATTERN_STATE_FILE), index=False)
+    funnel_table.to_parquet(os.path.join(state_folder, FUNNEL_STATE_FILE), index=False)
+    with open(os.path.join(state_folder, STATE_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
@@ -0,0 +1,189 @@
+import atexit
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Reports go to $RUN_REPORT_DIR (default ./run_reports); set $PROFILE_STAGE to
+# a stage name to also dump a cProfile of every call of that stage.
+REPORT_DIR = os.environ.get('RUN_REPORT_DIR', './run_reports')
+PROFILE_STAGE = os.environ.get('PROFILE_STAGE')
+
+_run = {}
+_stages = {}
+_open = []
+_profiles = {}
+# Highest high-water mark seen before a reset
+_process_peak = 0.0
+
+
+class Stage:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.peak_rss_mb = 0.0
+        # set to leave this call out of the report
+        self.discard = False
+
+
+def _status_mb(field):
+    # A /proc/self/status memory field (Linux), or None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb():
+    # High-water mark since the last reset (Linux), else since process start
+    peak = _status_mb('VmHWM')
+    if peak is not None:
+        return peak
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def peak_rss_mb():
+    """Peak RSS of the whole process in MB, across any high-water mark resets."""
+    return max(_process_peak, _peak_rss_mb())
+
+
+def current_rss_mb():
+    """Current RSS of the process in MB (Linux), else its peak."""
+    rss = _status_mb('VmRSS')
+    return _peak_rss_mb() if rss is None else rss
+
+
+def reset_peak_rss():
+    """Restarts the high-water mark at the current RSS, so the next peak read
+    covers only what follows.
+
+    Writing 5 to /proc/self/clear_refs rewinds the kernel's VmHWM, and with it
+    getrusage().ru_maxrss, for the whole process. The peak up to the reset is
+    kept here: read the process peak with peak_rss_mb(), not ru_maxrss. Open
+    stages keep what they reached so far.
+    """
+    global _process_peak
+    peak = _peak_rss_mb()
+    _process_peak = max(_process_peak, peak)
+    for stage in _open:
+        stage.peak_rss_mb = max(stage.peak_rss_mb, peak)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def _cpu_seconds():
+    # This process plus finished worker processes (pools shut down in-stage)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def start(script):
+    """Starts the run report of a script; it is written when the process exits."""
+    _run.update({
+        'script': script,
+        'argv': sys.argv[1:],
+        'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'wall': time.perf_counter(),
+        'cpu': _cpu_seconds()
+    })
+    atexit.register(write_report)
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """Records wall time, CPU time, peak RSS and row counts of a block.
+
+    Repeated stages (one per chunk or subgroup) are summed under one name.
+    Set `.rows_out` on the yielded Stage to report output rows. Once a run
+    report is started, every stage resets the high-water mark to see its own
+    peak (see reset_peak_rss); code that only imports the modules keeps the
+    process counters untouched.
+    """
+    record = Stage(name, rows_in)
+    if _run:
+        reset_peak_rss()
+    _open.append(record)
+    profile = _profiles.setdefault(name, cProfile.Profile()) if name == PROFILE_STAGE else None
+    wall, cpu = time.perf_counter(), _cpu_seconds()
+    if profile:
+        profile.enable()
+    try:
+        yield record
+    finally:
+        if profile:
+            profile.disable()
+        wall, cpu = time.perf_counter() - wall, _cpu_seconds() - cpu
+        _open.pop()
+        record.peak_rss_mb = max(record.peak_rss_mb, _peak_rss_mb())
+        for parent in _open:
+            parent.peak_rss_mb = max(parent.peak_rss_mb, record.peak_rss_mb)
+        if not record.discard:
+            _add_totals(record, wall, cpu)
+
+
+def _add_totals(record, wall, cpu):
+    totals = _stages.setdefault(record.name, {
+        'stage': record.name, 'calls': 0, 'wall_sec': 0.0, 'cpu_sec': 0.0,
+        'peak_rss_mb': 0.0, 'rows_in': None, 'rows_out': None
+    })
+    totals['calls'] += 1
+    totals['wall_sec'] += wall
+    totals['cpu_sec'] += cpu
+    totals['peak_rss_mb'] = max(totals['peak_rss_mb'], record.peak_rss_mb)
+    for key in ('rows_in', 'rows_out'):
+        value = getattr(record, key)
+        if value is not None:
+            totals[key] = (totals[key] or 0) + int(value)
+
+
+def timed_iter(iterable, name):
+    # Times every next() of an iterator (e.g. chunked CSV reads) as a stage;
+    # the final next() that finds the iterator exhausted is not a call
+    iterator = iter(iterable)
+    while True:
+        with stage(name) as record:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                record.discard = True
+                return
+            record.rows_out = len(item)
+        yield item
+
+
+def write_report():
+    if not _run or _run.get('written'):
+        return
+    _run['written'] = True
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    stamp = _run['started'].replace(':', '').replace('-', '')[:15]
+    base = os.path.join(REPORT_DIR, f"{_run['script']}_{stamp}")
+
+    report = {
+        'script': _run['script'],
+        'argv': _run['argv'],
+        'started': _run['started'],
+        'wall_sec': time.perf_counter() - _run['wall'],
+        'cpu_sec': _cpu_seconds() - _run['cpu'],
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': list(_stages.values())
+    }
+    for name, profile in _profiles.items():
+        profile.dump_stats(f'{base}_{name}.prof')
+        report['profile'] = f'{base}_{name}.prof'
+    with open(f'{base}.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Run report saved to {base}.json")
@@ -0,0 +1,100 @@
+import bisect
+
+import numpy as np
+
+from sequences import EVENT_TYPES, decode, encode
+
+
+class _TopK:
+    # Best k patterns of one variant, ordered like PrefixSpan.topk output:
+    # support descending, then pattern ascending.
+    def __init__(self, k, min_len, required):
+        self.k = k
+        self.min_len = min_len
+        self.required = None if required is None else set(encode(required))
+        self.entries = []
+
+    def accepts(self, pattern):
+        return len(pattern) >= self.min_len and (self.required is None or not self.required.isdisjoint(pattern))
+
+    def threshold(self):
+        return -self.entries[-1][0] if len(self.entries) == self.k else 0
+
+    def offer(self, support, pattern):
+        entry = (-support, decode(pattern))
+        if len(self.entries) < self.k or entry < self.entries[-1]:
+            bisect.insort(self.entries, entry)
+            del self.entries[self.k:]
+
+    def results(self):
+        return [(-neg_support, list(pattern)) for neg_support, pattern in self.entries]
+
+
+def _next_occurrence(sequences):
+    # nxt[x][j]: first position >= j in the flat code array holding event x
+    n = len(sequences.codes)
+    positions = np.arange(n + 1)
+    tables = []
+    for code in range(len(EVENT_TYPES)):
+        hits = np.where(np.r_[sequences.codes == code, False], positions, n)
+        tables.append(np.minimum.accumulate(hits[::-1])[::-1])
+    return tables
+
+
+def mine_topk(sequences, variants, k):
+    """Top-k sequential patterns for several variants in one PrefixSpan search.
+
+    variants is a list of (min_len, required_events); a pattern qualifies for a
+    variant when it is at least min_len long and, if required_events is given,
+    contains one of them. Branches are pruned once their support can no longer
+    enter any variant's top k, and branches that can never reach a required
+    event are pruned for the variants that need one. Returns one list of
+    (support, pattern) per variant.
+    """
+    heaps = [_TopK(k, min_len, required) for min_len, required in variants]
+    if len(sequences) == 0:
+        return [heap.results() for heap in heaps]
+
+    nxt = _next_occurrence(sequences)
+    required_codes = sorted(set().union(*(heap.required for heap in heaps if heap.required is not None)))
+
+    def reachable(pattern, starts, ends):
+        # Which variants could still be satisfied by this pattern or its extensions
+        ahead = np.zeros(len(starts), dtype=bool)
+        for code in required_codes:
+            ahead |= nxt[code][starts] < ends
+        can_add_required = ahead.any()
+        return [
+            heap.required is None or not heap.required.isdisjoint(pattern) or can_add_required
+            for heap in heaps
+        ]
+
+    def extensions(starts, ends):
+        children = []
+        for code in range(len(EVENT_TYPES)):
+            found = nxt[code][starts]
+            valid = found < ends
+            support = int(valid.sum())
+            if support:
+                children.append((support, code, found[valid] + 1, ends[valid]))
+        children.sort(key=lambda child: -child[0])
+        return children
+
+    # Depth-first search, most frequent extension first so the top-k lists
+    # fill up early and the pruning threshold rises quickly.
+    stack = [((), sequences.offsets[:-1], sequences.offsets[1:])]
+    while stack:
+        pattern, starts, ends = stack.pop()
+        children = []
+        for support, code, child_starts, child_ends in extensions(starts, ends):
+            child = pattern + (code,)
+            open_heaps = reachable(child, child_starts, child_ends)
+            if not any(is_open and support >= heap.threshold() for is_open, heap in zip(open_heaps, heaps)):
+                continue
+            for heap in heaps:
+                if heap.accepts(child):
+                    heap.offer(support, child)
+            children.append((child, child_starts, child_ends))
+        stack.extend(reversed(children))
+
+    return [heap.results() for heap in heaps]
@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from sequences import EventSequences
+
+_worker = {}
+
+
+def share_sessions(session_df, sequences, columns):
+    # Packs the session columns and the flat sequence arrays into one shared
+    # memory block. Categoricals travel as codes plus their categories.
+    arrays, categories = {'codes': sequences.codes, 'offsets': sequences.offsets}, {}
+    for col in columns:
+        values = session_df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[col] = values.cat.codes.to_numpy()
+            categories[col] = list(values.cat.categories)
+        else:
+            arrays[col] = values.to_numpy()
+
+    layout, size = {}, 0
+    for name, array in arrays.items():
+        size = -(-size // 8) * 8
+        layout[name] = (size, array.dtype.str, array.shape)
+        size += array.nbytes
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for name, array in arrays.items():
+        offset, dtype, shape = layout[name]
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = array
+    return shm, {'name': shm.name, 'layout': layout, 'categories': categories}
+
+
+def attach_sessions(spec):
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    arrays = {
+        name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+        for name, (offset, dtype, shape) in spec['layout'].items()
+    }
+    sequences = EventSequences(arrays.pop('codes'), arrays.pop('offsets'))
+    session_df = pd.DataFrame({
+        col: pd.Categorical.from_codes(values, categories=spec['categories'][col]) if col in spec['categories'] else values
+        for col, values in arrays.items()
+    })
+    return shm, session_df, sequences
+
+
+def _init_worker(spec):
+    _worker['shm'], _worker['session_df'], _worker['sequences'] = attach_sessions(spec)
+
+
+def _run_task(args):
+    fn, task = args
+    return fn(_worker['session_df'], _worker['sequences'], *task)
+
+
+def map_subgroups(fn, session_df, sequences, columns, tasks, workers):
+    # Runs fn(session_df, sequences, *task) for every task on a process pool.
+    # Results come back in task order, so output is identical to a serial run.
+    shm, spec = share_sessions(session_df, sequences, columns)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(spec,)) as pool:
+            return list(pool.map(_run_task, [(fn, task) for task in tasks]))
+    finally:
+        shm.close()
+        shm.unlink()
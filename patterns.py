@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+from sequences import encode
+
+_DONE = 255  # pattern slot past the last event; never equals an event code
+
+
+def count_full_sessions(sequences, top_k):
+    # Groups identical sequences, ordered like Counter.most_common (count,
+    # then first occurrence). labels[i] is the index of session i's pattern
+    # in the returned top list, or -1.
+    first, inverse = sequences.distinct()
+    counts = np.bincount(inverse, minlength=len(first))
+    top = np.lexsort((first, -counts))[:top_k]
+    rank = np.full(len(counts), -1, dtype=np.int64)
+    rank[top] = np.arange(len(top))
+    patterns = [sequences[int(first[i])] for i in top]
+    return patterns, counts[top], rank[inverse]
+
+
+def match_subsequences(sequences, patterns):
+    # Membership matrix (sessions x patterns): does the session contain the
+    # pattern as a subsequence? All patterns advance together, one event
+    # position at a time across every session that is still long enough.
+    n_patterns = len(patterns)
+    membership = np.zeros((len(sequences), n_patterns), dtype=bool)
+    if n_patterns == 0 or len(sequences) == 0:
+        return membership
+
+    pattern_lengths = np.array([len(p) for p in patterns])
+    table = np.full((n_patterns, pattern_lengths.max() + 1), _DONE, dtype=np.uint8)
+    for k, pattern in enumerate(patterns):
+        table[k, :len(pattern)] = encode(pattern)
+
+    lengths = sequences.lengths
+    order = np.argsort(-lengths, kind='stable')
+    starts = sequences.offsets[:-1][order]
+    active_counts = np.searchsorted(-lengths[order], -np.arange(lengths.max()), side='left')
+    state = np.zeros((len(sequences), n_patterns), dtype=np.int16)
+    columns = np.arange(n_patterns)
+
+    for pos, n_active in enumerate(active_counts):
+        events = sequences.codes[starts[:n_active] + pos]
+        active = state[:n_active]
+        active += table[columns, active] == events[:, None]
+
+    membership[order] = state >= pattern_lengths
+    return membership
+
+
+def membership_stats(membership, group_sessions):
+    # avg_price / common_time_of_day / avg_duration_sec for every column of
+    # the membership matrix.
+    price = group_sessions['avg_price'].to_numpy(dtype=np.float64)
+    duration = group_sessions['duration_sec'].to_numpy(dtype=np.float64)
+    time_of_day = pd.Categorical(group_sessions['time_of_day'])
+    time_of_day = time_of_day.reorder_categories(time_of_day.categories.sort_values())
+    tod_codes = time_of_day.codes
+
+    stats = []
+    for k in range(membership.shape[1]):
+        matched = membership[:, k]
+        tod_counts = np.bincount(tod_codes[matched & (tod_codes >= 0)], minlength=len(time_of_day.categories))
+        stats.append({
+            'avg_price': price[matched].mean() if matched.any() else np.nan,
+            'common_time_of_day': time_of_day.categories[tod_counts.argmax()] if tod_counts.sum() else None,
+            'avg_duration_sec': duration[matched].mean() if matched.any() else np.nan,
+        })
+    return stats
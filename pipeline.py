@@ -0,0 +1,219 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = '.pipeline_state.json'
+LOG_FOLDER = './pipeline_logs'
+# Files up to this size are fingerprinted by content, larger ones (raw data,
+# chunks) by size and mtime
+CONTENT_HASH_LIMIT = 1 << 20
+
+LIBRARY = ['features.py', 'storage.py', 'sketches.py', 'sequences.py', 'instrument.py']
+
+
+def build_stages(args):
+    # Stage name -> script, arguments, upstream stages, inputs and outputs.
+    # Inputs are files or folders; a stage is fresh when its inputs (code
+    # included) and args fingerprint the same as on its last successful run.
+    # Options only change how a stage runs, not its output, so they are not
+    # part of the fingerprint.
+    workers = ['--workers', str(args.workers)] if args.workers > 1 else []
+    return {
+        'cleaning': {
+            'script': 'cleaning.py', 'args': ['--input', *args.input], 'options': workers, 'deps': [],
+            'inputs': [*args.input, 'cleaning.py', 'dimensions.py', *LIBRARY],
+            'outputs': ['split_data/_manifest.json']
+        },
+        'sessions': {
+            'script': 'sessions.py', 'args': [], 'options': workers, 'deps': ['cleaning'],
+            'inputs': ['split_data', 'sessions.py', *LIBRARY],
+            'outputs': ['session_cache/state.json']
+        },
+        'analysis': {
+            'script': 'analysis.py', 'args': [], 'options': workers, 'deps': ['sessions'],
+            'inputs': ['session_cache', 'analysis.py', 'sessions.py', 'mining.py', 'patterns.py', 'sampling.py', 'parallel.py', 'incremental.py', *LIBRARY],
+            'outputs': ['analysis_results/deep_dive_patterns.csv', 'analysis_results/cart_behavior_metrics.csv']
+        },
+        'extra': {
+            'script': 'extra.py', 'args': [], 'deps': ['cleaning'],
+            'inputs': ['split_data/_dims', 'extra.py', 'dimensions.py', *LIBRARY],
+            'outputs': ['brand_maincategory_map.csv']
+        },
+        'session_analysis': {
+            'script': 'session_analysis.py', 'args': [], 'deps': ['sessions'],
+            'inputs': ['session_cache', 'session_analysis.py', 'sessions.py', *LIBRARY],
+            'outputs': ['session_analysis_with_patterns.csv']
+        },
+        'understand_session': {
+            'script': 'understand_session.py', 'args': [], 'deps': ['session_analysis'],
+            'inputs': ['session_analysis_with_patterns.csv', 'understand_session.py', 'sketches.py', 'instrument.py'],
+            'outputs': ['pattern_counts.csv', 'interaction_pattern_counts.csv']
+        },
+        'understand_patterns': {
+            'script': 'understand_patterns.py', 'args': [], 'deps': ['analysis'],
+            'inputs': ['analysis_results/deep_dive_patterns.csv', 'understand_patterns.py', 'instrument.py'],
+            'outputs': ['analysis_results/summary_price_chunk.csv']
+        },
+    }
+
+
+def _file_fingerprint(path, digest):
+    stat = os.stat(path)
+    if stat.st_size <= CONTENT_HASH_LIMIT:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    else:
+        digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+
+
+def fingerprint(stage):
+    digest = hashlib.sha1(json.dumps([stage['script'], stage['args']]).encode())
+    for path in stage['inputs']:
+        # Library code lives next to this file, data in the working directory
+        if not os.path.exists(path) and os.path.exists(os.path.join(SCRIPT_DIR, path)):
+            path = os.path.join(SCRIPT_DIR, path)
+        digest.update(f'|{os.path.basename(path)}|'.encode())
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    digest.update(os.path.relpath(os.path.join(root, name), path).encode())
+                    _file_fingerprint(os.path.join(root, name), digest)
+        elif os.path.exists(path):
+            _file_fingerprint(path, digest)
+        else:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+
+def read_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def write_state(state):
+    with open(STATE_FILE + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(STATE_FILE + '.tmp', STATE_FILE)
+
+
+def select(stages, targets):
+    # The targets plus everything upstream of them, in dependency order
+    order, seen = [], set()
+    def visit(name):
+        if name not in seen:
+            seen.add(name)
+            for dep in stages[name]['deps']:
+                visit(dep)
+            order.append(name)
+    for name in targets:
+        visit(name)
+    return order
+
+
+def is_fresh(name, stage, state):
+    return (
+        state.get(name) == fingerprint(stage)
+        and all(os.path.exists(path) for path in stage['outputs'])
+    )
+
+
+def run_stage(name, stage):
+    # Runs one script; its output goes to pipeline_logs/<stage>.log
+    os.makedirs(LOG_FOLDER, exist_ok=True)
+    start = time.perf_counter()
+    with open(os.path.join(LOG_FOLDER, f'{name}.log'), 'w') as log:
+        result = subprocess.run(
+            [sys.executable, os.path.join(SCRIPT_DIR, stage['script']), *stage['args'], *stage.get('options', [])],
+            stdout=log, stderr=subprocess.STDOUT
+        )
+    return result.returncode, time.perf_counter() - start
+
+
+def run(stages, order, force=(), jobs=1, dry_run=False):
+    """Runs the stages in `order`, skipping fresh ones.
+
+    A stage starts once all its upstream stages are done, so independent
+    stages run side by side on up to `jobs` threads. Returns the names of
+    failed stages.
+    """
+    state = read_state()
+    done, failed, stale, running = set(), [], set(), {}
+    pending = list(order)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                stage = stages[name]
+                deps = [dep for dep in stage['deps'] if dep in order]
+                if any(dep in failed for dep in deps):
+                    print(f"[skip] {name}: upstream failed")
+                    pending.remove(name)
+                    failed.append(name)
+                elif all(dep in done for dep in deps):
+                    pending.remove(name)
+                    # (a dry run cannot tell whether stale upstream output would change)
+                    upstream_stale = any(dep in stale for dep in deps)
+                    if name not in force and not upstream_stale and is_fresh(name, stage, state):
+                        print(f"[fresh] {name}")
+                        done.add(name)
+                    elif dry_run:
+                        print(f"[stale] {name}")
+                        stale.add(name)
+                        done.add(name)
+                    else:
+                        print(f"[run] {name}: {' '.join([stage['script'], *stage['args'], *stage.get('options', [])])}")
+                        running[pool.submit(run_stage, name, stage)] = name
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                returncode, seconds = future.result()
+                if returncode == 0:
+                    print(f"[done] {name} in {seconds:.1f}s")
+                    # Fingerprint after the run: stages may touch their own inputs
+                    state[name] = fingerprint(stages[name])
+                    write_state(state)
+                    done.add(name)
+                else:
+                    print(f"[fail] {name} (exit {returncode}); see {LOG_FOLDER}/{name}.log")
+                    failed.append(name)
+    return failed
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the pipeline stages that are out of date.")
+    parser.add_argument('targets', nargs='*', help="stages to bring up to date (default: all)")
+    parser.add_argument('--input', nargs='+', default=['2019-Oct.csv'], help="raw event files for cleaning")
+    parser.add_argument('--jobs', type=int, default=3, help="stages run concurrently")
+    parser.add_argument('--workers', type=int, default=1, help="passed on to cleaning.py, sessions.py and analysis.py; does not make stages stale")
+    parser.add_argument('--force', nargs='*', default=[], metavar='STAGE', help="rerun these stages even if fresh")
+    parser.add_argument('--dry-run', action='store_true', help="only show which stages are stale")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stages = build_stages(args)
+    unknown = [name for name in args.targets + args.force if name not in stages]
+    if unknown:
+        sys.exit(f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(stages)})")
+
+    order = select(stages, args.targets or list(stages))
+    failed = run(stages, order, force=set(args.force), jobs=args.jobs, dry_run=args.dry_run)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
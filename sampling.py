@@ -0,0 +1,49 @@
+import numpy as np
+
+# 95% two-sided normal quantile
+Z_95 = 1.959964
+
+
+def stratified_sample(lengths, fraction, min_size=0, seed=0):
+    """Sorted row indices of a session sample stratified by session length.
+
+    Sessions are grouped by log2 of their length and every stratum is
+    sampled at the same rate, so short and long sessions keep their share.
+    Groups of at most max(min_size, fraction * n) sessions are kept whole.
+    """
+    lengths = np.asarray(lengths)
+    n = len(lengths)
+    if n <= max(min_size, fraction * n):
+        return np.arange(n)
+    rate = max(fraction, min_size / n)
+
+    rng = np.random.default_rng(seed)
+    strata = np.log2(np.maximum(lengths, 1)).astype(np.int64)
+    picks = []
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        size = min(len(members), int(np.ceil(rate * len(members))))
+        picks.append(rng.choice(members, size, replace=False))
+    return np.sort(np.concatenate(picks))
+
+
+def wilson_interval(successes, n, z=Z_95):
+    # Wilson score interval of a binomial proportion; stays inside [0, 1]
+    # and behaves for supports close to 0 or n
+    successes = np.asarray(successes, dtype=np.float64)
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    return np.maximum(center - half, 0.0), np.minimum(center + half, 1.0)
+
+
+def support_bounds(sample_support, sample_size, population, z=Z_95):
+    # Support in the whole group estimated from the sample, with its Wilson
+    # bounds. A sample covering the group is exact.
+    sample_support = np.asarray(sample_support, dtype=np.float64)
+    estimate = sample_support / sample_size * population
+    if sample_size >= population:
+        return estimate, estimate.copy(), estimate.copy()
+    low, high = wilson_interval(sample_support, sample_size, z)
+    return estimate, low * population, high * population
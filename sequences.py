@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+EVENT_TYPES = ['view', 'cart', 'remove_from_cart', 'purchase']
+EVENT_CODES = {event: code for code, event in enumerate(EVENT_TYPES)}
+INTERACTION_EVENTS = ['cart', 'purchase', 'remove_from_cart']
+PATTERN_SEPARATOR = ' ➔ '
+
+_HASH_BASE = np.uint64(0x100000001B3)
+_HASH_LENGTH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def encode(pattern):
+    return np.array([EVENT_CODES[event] for event in pattern], dtype=np.uint8)
+
+
+def decode(codes):
+    return tuple(EVENT_TYPES[code] for code in codes)
+
+
+class EventSequences:
+    """Event sequences of many sessions stored as one flat uint8 array.
+
+    Session i holds codes[offsets[i]:offsets[i + 1]], with codes indexing
+    EVENT_TYPES (CSR layout).
+    """
+
+    def __init__(self, codes, offsets):
+        self.codes = np.asarray(codes, dtype=np.uint8)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_lists(cls, sequences):
+        sequences = list(sequences)
+        lengths = np.fromiter((len(seq) for seq in sequences), dtype=np.int64, count=len(sequences))
+        codes = np.fromiter((EVENT_CODES[event] for seq in sequences for event in seq), dtype=np.uint8, count=lengths.sum())
+        return cls(codes, np.r_[0, np.cumsum(lengths)])
+
+    @classmethod
+    def from_events(cls, event_type, groups, n_groups):
+        # event_type must already be ordered by group and time within group
+        event_type = pd.Categorical(event_type)
+        lookup = np.array([EVENT_CODES[event] for event in event_type.categories], dtype=np.uint8)
+        lengths = np.bincount(groups, minlength=n_groups)
+        return cls(lookup[event_type.codes], np.r_[0, np.cumsum(lengths)])
+
+    @classmethod
+    def concat(cls, parts):
+        lengths = np.concatenate([part.lengths for part in parts])
+        return cls(np.concatenate([part.codes for part in parts]), np.r_[0, np.cumsum(lengths)])
+
+    @classmethod
+    def from_arrow(cls, array):
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        offsets = array.offsets.to_numpy()
+        codes = array.values.to_numpy()
+        return cls(codes[offsets[0]:offsets[-1]], offsets - offsets[0])
+
+    def to_arrow(self):
+        return pa.LargeListArray.from_arrays(pa.array(self.offsets, pa.int64()), pa.array(self.codes, pa.uint8()))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return decode(self.codes[self.offsets[key]:self.offsets[key + 1]])
+        return self.take(np.arange(len(self))[key])
+
+    def __iter__(self):
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield decode(self.codes[start:end])
+
+    def take(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        lengths = self.lengths[indices]
+        offsets = np.r_[0, np.cumsum(lengths)]
+        positions = np.repeat(self.offsets[indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return EventSequences(self.codes[positions], offsets)
+
+    def positions(self):
+        # Position of every event inside its own session
+        return np.arange(len(self.codes)) - np.repeat(self.offsets[:-1], self.lengths)
+
+    def session_ids(self):
+        return np.repeat(np.arange(len(self)), self.lengths)
+
+    def collapse_repeats(self):
+        # view, view, cart, cart, view -> view, cart, view
+        keep = np.r_[True, self.codes[1:] != self.codes[:-1]] | (self.positions() == 0)
+        lengths = np.bincount(self.session_ids()[keep], minlength=len(self))
+        return EventSequences(self.codes[keep], np.r_[0, np.cumsum(lengths)])
+
+    def first_positions(self, event):
+        # Index of the first `event` in each session, -1 when absent
+        hits = np.flatnonzero(self.codes == EVENT_CODES[event])
+        sessions, first = np.unique(self.session_ids()[hits], return_index=True)
+        result = np.full(len(self), -1, dtype=np.int32)
+        result[sessions] = self.positions()[hits[first]]
+        return result
+
+    def contains_any(self, events):
+        hits = np.isin(self.codes, encode(events))
+        return np.bincount(self.session_ids()[hits], minlength=len(self)) > 0
+
+    def hashes(self):
+        # Polynomial hash over the codes (mod 2**64) mixed with the length;
+        # equal sequences always share a hash, but different ones can collide
+        # (see distinct).
+        lengths = self.lengths
+        h = lengths.astype(np.uint64) * _HASH_LENGTH_MIX
+        nonempty = lengths > 0
+        if nonempty.any():
+            powers = np.cumprod(np.full(lengths.max(), _HASH_BASE, dtype=np.uint64))
+            contrib = (self.codes.astype(np.uint64) + np.uint64(1)) * powers[self.positions()]
+            h[nonempty] += np.add.reduceat(contrib, self.offsets[:-1][nonempty])
+        return h
+
+    def distinct(self):
+        # Exact grouping of identical sequences: (first, inverse), where
+        # first[g] is the first session of group g and inverse[i] the group
+        # of session i. Sessions are grouped by hash and then compared with
+        # their group's first session, so hash collisions are split apart.
+        _, first, inverse = np.unique(self.hashes(), return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+        rep = first[inverse]
+        lengths = self.lengths
+        differs = lengths != lengths[rep]
+
+        session = self.session_ids()
+        check = ~differs[session]
+        rep_codes = self.codes[self.offsets[rep[session[check]]] + self.positions()[check]]
+        mismatched = session[check][self.codes[check] != rep_codes]
+        differs[mismatched] = True
+        if not differs.any():
+            return first, inverse
+
+        first, groups = list(first), {}
+        for i in np.flatnonzero(differs):
+            key = (int(inverse[i]), self.codes[self.offsets[i]:self.offsets[i + 1]].tobytes())
+            if key not in groups:
+                groups[key] = len(first)
+                first.append(i)
+            inverse[i] = groups[key]
+        return np.asarray(first, dtype=np.int64), inverse
+
+    def equals(self, pattern):
+        codes = encode(pattern)
+        result = self.lengths == len(codes)
+        candidates = np.flatnonzero(result)
+        if len(codes) and len(candidates):
+            window = self.codes[self.offsets[candidates][:, None] + np.arange(len(codes))]
+            result[candidates] = (window == codes).all(axis=1)
+        return result
+
+    def to_strings(self, sep=PATTERN_SEPARATOR):
+        # Join each distinct sequence once and broadcast it back
+        first, inverse = self.distinct()
+        joined = np.array([sep.join(self[int(i)]) for i in first], dtype=object)
+        return joined[inverse]
@@ -0,0 +1,356 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import features
+import instrument
+import storage
+from sequences import EventSequences
+
+input_folder = './split_data'
+cache_folder = './session_cache'
+
+# Bump when the session table layout changes so stale caches are rebuilt
+SESSION_TABLE_VERSION = 6
+
+STATE_FILE = 'state.json'
+OPEN_EVENTS_FILE = 'open_events.parquet'
+# Sessions whose last event is this close to the newest event are kept as
+# raw events, since the next batch of chunks may still extend them
+OPEN_SESSION_WINDOW = pd.Timedelta(hours=1)
+
+EVENT_COLUMNS = ['event_time', 'event_type', 'product_id', 'brand', 'price', 'user_session', 'price_chunk', 'main_category']
+MODE_COLUMNS = ['time_of_day', 'price_chunk', 'main_category']
+# first position of each funnel event in the session, -1 when absent
+FUNNEL_COLUMNS = {'first_cart': 'cart', 'first_purchase': 'purchase', 'first_remove': 'remove_from_cart'}
+
+
+def fingerprint(files):
+    digest = hashlib.sha1(f'v{SESSION_TABLE_VERSION}'.encode())
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def group_mode(groups, values, n_groups):
+    # Most frequent category per group, counted over (group, code) pairs in
+    # one pass. Categories are sorted first so ties go to the alphabetically
+    # first value, like Series.mode on strings.
+    values = pd.Categorical(values)
+    values = values.reorder_categories(values.categories.sort_values())
+    codes = values.codes.astype(np.int64)
+    valid = codes >= 0
+    n_values = max(len(values.categories), 1)
+
+    pairs, counts = np.unique(groups[valid].astype(np.int64) * n_values + codes[valid], return_counts=True)
+    pair_groups, pair_values = np.divmod(pairs, n_values)
+
+    order = np.lexsort((pair_values, -counts, pair_groups))
+    first = order[np.r_[True, pair_groups[order][1:] != pair_groups[order][:-1]]]
+
+    result = np.full(n_groups, -1, dtype=np.int64)
+    result[pair_groups[first]] = pair_values[first]
+    return pd.Categorical.from_codes(result, categories=values.categories)
+
+
+def build_sessions(events):
+    events = events.dropna(subset=['event_type', 'product_id', 'user_session', 'price', 'price_chunk', 'main_category'])
+    events['time_of_day'] = features.time_of_day(events['event_time'])
+    events['price'] = storage.price_values(events['price'])
+
+    # Sorting and grouping run on the integer codes of the session ids
+    if not isinstance(events['user_session'].dtype, pd.CategoricalDtype):
+        events['user_session'] = events['user_session'].astype('category')
+    with instrument.stage('sort_events', rows_in=len(events)):
+        events = events.sort_values(['user_session', 'event_time'])
+    grouped = events.groupby('user_session', sort=False, observed=True)
+
+    with instrument.stage('groupby', rows_in=len(events)) as stage:
+        sessions = grouped.agg(
+            start_time=('event_time', 'min'),
+            end_time=('event_time', 'max'),
+            unique_products=('product_id', 'nunique'),
+            unique_brands=('brand', 'nunique'),
+            avg_price=('price', 'mean'),
+        )
+        sessions = sessions.astype({'unique_products': 'int32', 'unique_brands': 'int32'})
+        sessions['duration_sec'] = (sessions['end_time'] - sessions['start_time']).dt.total_seconds()
+        groups = grouped.ngroup().to_numpy()
+        stage.rows_out = len(sessions)
+
+    with instrument.stage('session_modes', rows_in=len(events)):
+        for col in MODE_COLUMNS:
+            sessions[col] = group_mode(groups, events[col], len(sessions))
+
+    with instrument.stage('session_sequences', rows_in=len(events)):
+        sequences = EventSequences.from_events(events['event_type'], groups, len(sessions))
+        for col, event in FUNNEL_COLUMNS.items():
+            sessions[col] = sequences.first_positions(event)
+
+    return sessions.reset_index(), sequences
+
+
+def write_session_table(path, sessions, sequences):
+    table = pa.Table.from_pandas(sessions, preserve_index=False)
+    table = table.append_column('session_sequence', sequences.to_arrow())
+    pq.write_table(table, path)
+
+
+def read_session_table(path, columns=None):
+    # user_session comes back dictionary encoded, one integer code per session
+    table = pq.read_table(
+        path, columns=None if columns is None else columns + ['session_sequence'], read_dictionary=['user_session']
+    )
+    sequences = EventSequences.from_arrow(table.column('session_sequence'))
+    sessions = table.drop_columns(['session_sequence']).to_pandas()
+    return sessions, sequences
+
+
+def session_table_path(cache_folder, session_fingerprint):
+    return os.path.join(cache_folder, f'sessions_{session_fingerprint}.parquet')
+
+
+def read_state(cache_folder):
+    path = os.path.join(cache_folder, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_state(cache_folder, state):
+    path = os.path.join(cache_folder, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def open_session_events(events, sessions):
+    cutoff = sessions['end_time'].max() - OPEN_SESSION_WINDOW
+    open_ids = sessions.loc[sessions['end_time'] >= cutoff, 'user_session']
+    return events.loc[events['user_session'].isin(open_ids), EVENT_COLUMNS]
+
+
+def as_categoricals(sessions):
+    # Concatenated tables lose the categorical dtype when categories differ
+    for col in MODE_COLUMNS:
+        sessions[col] = pd.Categorical(sessions[col].astype(object))
+    return sessions
+
+
+def stack_sessions(tables):
+    # Stacks session tables in user_session order, stably, like an
+    # unpartitioned build. The session id categories of all tables are
+    # unioned and sorted in Arrow and the rows are sorted on the resulting
+    # integer codes, so no per-row Python strings are built or compared.
+    # Returns the stacked table and the order applied to its rows.
+    ids = [pd.Categorical(table['user_session']) for table in tables]
+    categories = pa.chunked_array([pa.array(c.categories, type=pa.string()) for c in ids], type=pa.string()).combine_chunks()
+    sort = pc.sort_indices(categories).to_numpy()
+    ordered = categories.take(sort)
+    # (a session id in several tables gets a single category)
+    is_new = np.ones(len(ordered), dtype=bool)
+    if len(ordered) > 1:
+        is_new[1:] = pc.not_equal(ordered.slice(1), ordered.slice(0, len(ordered) - 1)).to_numpy(zero_copy_only=False)
+    rank = np.empty(len(ordered), dtype=np.int64)
+    rank[sort] = np.cumsum(is_new) - 1
+    offsets = np.cumsum([0] + [len(c.categories) for c in ids])
+    codes = np.concatenate([np.where(c.codes >= 0, rank[offset + c.codes], -1) for c, offset in zip(ids, offsets)])
+    order = np.argsort(codes, kind='stable')
+
+    stacked = as_categoricals(pd.concat([table.drop(columns='user_session') for table in tables], ignore_index=True))
+    user_session = pd.Categorical.from_codes(codes, categories=ordered.filter(pa.array(is_new)).to_pandas())
+    stacked.insert(tables[0].columns.get_loc('user_session'), 'user_session', user_session)
+    return stacked.iloc[order].reset_index(drop=True), order
+
+
+def _sessionize_bucket(input_folder, files, part_file):
+    # Sessions of one hash bucket. Returns the events of sessions still open
+    # at the end of this bucket, a superset of the globally open ones.
+    with instrument.stage('read_events') as stage:
+        events = storage.read_events(input_folder, columns=EVENT_COLUMNS, files=files)
+        stage.rows_out = len(events)
+    sessions, sequences = build_sessions(events)
+    write_session_table(part_file, sessions, sequences)
+    return open_session_events(events, sessions)
+
+
+def _build_buckets(input_folder, cache_folder, buckets, workers=None):
+    # Every session lives in exactly one bucket, so buckets are sessionized
+    # independently and only one bucket's events are in memory per worker.
+    print(f"Building sessions from {len(buckets)} session buckets...")
+    part_files = [os.path.join(cache_folder, f'part_{bucket:03d}.parquet') for bucket in buckets]
+    tasks = list(zip([input_folder] * len(buckets), buckets.values(), part_files))
+    if workers and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            candidates = list(pool.map(_sessionize_bucket, *zip(*tasks)))
+    else:
+        candidates = [_sessionize_bucket(*task) for task in tasks]
+
+    # Stitch the per-bucket session rows back into one table ordered by
+    # user_session, the same as an unpartitioned build
+    parts = [read_session_table(part_file) for part_file in part_files]
+    sessions, order = stack_sessions([part for part, _ in parts])
+    sequences = EventSequences.concat([part_sequences for _, part_sequences in parts]).take(order)
+    for part_file in part_files:
+        os.remove(part_file)
+
+    open_events = pd.concat(candidates, ignore_index=True)
+    return sessions, sequences, open_session_events(open_events, sessions)
+
+
+def _build_all(input_folder, cache_folder, files, session_fingerprint, workers=None):
+    os.makedirs(cache_folder, exist_ok=True)
+    for pattern in ['sessions_*.parquet', 'delta_*.parquet', 'part_*.parquet', OPEN_EVENTS_FILE]:
+        for stale in glob.glob(os.path.join(cache_folder, pattern)):
+            os.remove(stale)
+
+    buckets = storage.bucket_files(files)
+    if buckets is None:
+        print("Building sessions...")
+        with instrument.stage('read_events') as stage:
+            events = storage.read_events(input_folder, columns=EVENT_COLUMNS, files=files)
+            stage.rows_out = len(events)
+        sessions, sequences = build_sessions(events)
+        open_events = open_session_events(events, sessions)
+        del events
+    else:
+        sessions, sequences, open_events = _build_buckets(input_folder, cache_folder, buckets, workers)
+
+    cache_file = session_table_path(cache_folder, session_fingerprint)
+    with instrument.stage('write_sessions', rows_in=len(sessions)):
+        write_session_table(cache_file, sessions, sequences)
+    open_events.to_parquet(os.path.join(cache_folder, OPEN_EVENTS_FILE), index=False)
+    write_state(cache_folder, {
+        'version': SESSION_TABLE_VERSION,
+        'fingerprint': session_fingerprint,
+        'files': {os.path.basename(f): storage.file_signature(f) for f in files},
+        'deltas': []
+    })
+    print(f"Saved {len(sessions):,} sessions to {cache_file}")
+
+
+def _append_chunks(input_folder, cache_folder, state, files, session_fingerprint):
+    # Sessionizes only the new chunks. Sessions they touch are rebuilt from
+    # the open-session checkpoint plus the new events; sessions closed
+    # before the checkpoint window are re-read from the old chunks.
+    old_files = [f for f in files if os.path.basename(f) in state['files']]
+    new_files = [f for f in files if os.path.basename(f) not in state['files']]
+    print(f"Adding {len(new_files)} new chunk files to the cached sessions...")
+
+    old_sessions, old_sequences = read_session_table(session_table_path(cache_folder, state['fingerprint']))
+    open_events = pd.read_parquet(os.path.join(cache_folder, OPEN_EVENTS_FILE))
+    new_events = storage.read_events(input_folder, columns=EVENT_COLUMNS, files=new_files)
+
+    touched = new_events['user_session'].unique()
+    known = old_sessions['user_session'].isin(touched).to_numpy()
+    carried = open_events[open_events['user_session'].isin(touched)]
+    late = old_sessions.loc[known, 'user_session']
+    late = late[~late.isin(carried['user_session'])]
+
+    parts = [carried, new_events]
+    if len(late):
+        print(f"Re-reading {len(late):,} sessions that reopened after the checkpoint window...")
+        parts.append(storage.read_events(input_folder, columns=EVENT_COLUMNS, files=old_files, sessions=late))
+    events = pd.concat(parts, ignore_index=True)
+    rebuilt, rebuilt_sequences = build_sessions(events)
+
+    # Delta for downstream consumers: old versions out (-1), rebuilt in (+1)
+    delta = as_categoricals(pd.concat([old_sessions[known].assign(sign=-1), rebuilt.assign(sign=1)], ignore_index=True))
+    delta_sequences = EventSequences.concat([old_sequences[known], rebuilt_sequences])
+    delta_file = f"delta_{state['fingerprint']}_{session_fingerprint}.parquet"
+    write_session_table(os.path.join(cache_folder, delta_file), delta, delta_sequences)
+
+    sessions, order = stack_sessions([old_sessions[~known], rebuilt])
+    sequences = EventSequences.concat([old_sequences[~known], rebuilt_sequences]).take(order)
+
+    recent = pd.concat([open_events[~open_events['user_session'].isin(touched)], events], ignore_index=True)
+    open_session_events(recent, sessions).to_parquet(os.path.join(cache_folder, OPEN_EVENTS_FILE), index=False)
+
+    write_session_table(session_table_path(cache_folder, session_fingerprint), sessions, sequences)
+    os.remove(session_table_path(cache_folder, state['fingerprint']))
+    state['deltas'].append({'from': state['fingerprint'], 'to': session_fingerprint, 'file': delta_file})
+    state['fingerprint'] = session_fingerprint
+    state['files'] = {os.path.basename(f): storage.file_signature(f) for f in files}
+    write_state(cache_folder, state)
+    print(f"Updated {len(rebuilt):,} sessions; {len(sessions):,} sessions in total")
+
+
+def refresh_sessions(input_folder=input_folder, cache_folder=cache_folder, files=None, workers=None):
+    # Makes sure the cached session table matches the chunks and returns its
+    # fingerprint. When chunks were only added since the last build, just
+    # the new chunks are sessionized. Bucketed chunks are sessionized one
+    # bucket at a time, on `workers` processes.
+    files = storage.chunk_files(input_folder) if files is None else files
+    session_fingerprint = fingerprint(files)
+    if os.path.exists(session_table_path(cache_folder, session_fingerprint)):
+        return session_fingerprint
+
+    state = read_state(cache_folder)
+    signatures = {os.path.basename(f): storage.file_signature(f) for f in files}
+    appended = (
+        state is not None
+        and state['version'] == SESSION_TABLE_VERSION
+        and os.path.exists(session_table_path(cache_folder, state['fingerprint']))
+        and all(signatures.get(name) == signature for name, signature in state['files'].items())
+    )
+    # Covers bucket workers too, whose own stages are not reported
+    with instrument.stage('sessionize'):
+        if appended:
+            _append_chunks(input_folder, cache_folder, state, files, session_fingerprint)
+        else:
+            _build_all(input_folder, cache_folder, files, session_fingerprint, workers)
+    return session_fingerprint
+
+
+def load_deltas(since_fingerprint, cache_folder=cache_folder):
+    # Session deltas (rows with sign -1/+1 and their sequences) leading from
+    # an older table to the current one, or None if the chain is broken.
+    state = read_state(cache_folder)
+    if state is None:
+        return None
+    if since_fingerprint == state['fingerprint']:
+        return []
+    steps = [step['from'] for step in state['deltas']]
+    if since_fingerprint not in steps:
+        return None
+    return [
+        read_session_table(os.path.join(cache_folder, step['file']))
+        for step in state['deltas'][steps.index(since_fingerprint):]
+    ]
+
+
+def load_sessions(input_folder=input_folder, cache_folder=cache_folder, files=None, columns=None, workers=None):
+    # The session table is cached per fingerprint of the input chunks, so
+    # every script shares one sessionization of the same data. Returns the
+    # per-session columns and the aligned EventSequences.
+    session_fingerprint = refresh_sessions(input_folder, cache_folder, files, workers)
+    cache_file = session_table_path(cache_folder, session_fingerprint)
+    print(f"Loading cached sessions from {cache_file}...")
+    with instrument.stage('read_sessions') as stage:
+        sessions, sequences = read_session_table(cache_file, columns)
+        stage.rows_out = len(sessions)
+    return sessions, sequences
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or update the cached session table.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="sessionize session buckets on a pool of N processes")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    instrument.start('sessions')
+    refresh_sessions(workers=args.workers)
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+
+class KLLSketch:
+    """Mergeable streaming quantile sketch (KLL compactor hierarchy).
+
+    Memory stays around 3 * k floats no matter how many values are fed in,
+    with a rank error of roughly 1.7 / k.
+    """
+
+    def __init__(self, k=400, seed=None):
+        self.k = k
+        self.n = 0
+        self.compactors = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            buf = self.compactors[level]
+            if len(buf) > self._capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0))
+                buf = np.sort(buf)
+                keep = buf[len(buf) - len(buf) % 2:]
+                promoted = buf[self._rng.integers(2):len(buf) - len(keep):2]
+                self.compactors[level] = keep
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, buf in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], buf])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def quantile(self, qs):
+        items = np.concatenate(self.compactors)
+        if len(items) == 0:
+            return np.full(len(np.atleast_1d(qs)), np.nan)
+        weights = np.concatenate([np.full(len(buf), 2 ** level) for level, buf in enumerate(self.compactors)])
+        order = np.argsort(items, kind='stable')
+        items, cum = items[order], np.cumsum(weights[order])
+        ranks = np.atleast_1d(qs) * cum[-1]
+        return items[np.minimum(np.searchsorted(cum, ranks, side='left'), len(items) - 1)]
+
+
+class SpaceSaving:
+    """Mergeable heavy-hitter summary with at most `capacity` counters.
+
+    Every item whose true count exceeds `floor` (about n / capacity) is
+    tracked, and a tracked item's true count lies in [count - error, count].
+    Items are any values np.unique can sort; `first` remembers the earliest
+    position an item was seen at, for stable tie-breaking.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.n = 0
+        self.floor = 0
+        self.items = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.errors = np.empty(0, dtype=np.int64)
+        self.first = np.empty(0, dtype=np.int64)
+
+    def _truncate(self):
+        if len(self.items) <= self.capacity:
+            return
+        order = np.lexsort((self.first, -self.counts))
+        keep, dropped = order[:self.capacity], order[self.capacity:]
+        self.floor = max(self.floor, int(self.counts[dropped].max()))
+        self.items, self.counts = self.items[keep], self.counts[keep]
+        self.errors, self.first = self.errors[keep], self.first[keep]
+
+    def update(self, items, positions=None):
+        # One batch of the stream; positions default to the running offset
+        items = np.asarray(items)
+        batch = SpaceSaving(self.capacity)
+        batch.items, index, batch.counts = np.unique(items, return_index=True, return_counts=True)
+        batch.errors = np.zeros(len(batch.items), dtype=np.int64)
+        batch.first = (self.n + index if positions is None else np.asarray(positions)[index]).astype(np.int64)
+        batch.n = len(items)
+        batch._truncate()
+        return self.merge(batch)
+
+    def merge(self, other):
+        # An item missing from one summary may still have up to that
+        # summary's floor occurrences there, so the floor is added to both
+        # its count and its error.
+        # (an empty summary has no item dtype yet, so it is left out)
+        parts = [summary.items for summary in (self, other) if len(summary.items)]
+        items, inverse = np.unique(np.concatenate(parts or [other.items]), return_inverse=True)
+        ours, theirs = inverse[:len(self.items)], inverse[len(self.items):]
+        counts = np.full(len(items), self.floor + other.floor, dtype=np.int64)
+        errors = counts.copy()
+        first = np.full(len(items), np.iinfo(np.int64).max, dtype=np.int64)
+        for summary, index in ((self, ours), (other, theirs)):
+            counts[index] += summary.counts - summary.floor
+            errors[index] += summary.errors - summary.floor
+            np.minimum.at(first, index, summary.first)
+
+        self.items, self.counts, self.errors, self.first = items, counts, errors, first
+        self.n += other.n
+        self.floor += other.floor
+        self._truncate()
+        return self
+
+    def top(self, k):
+        # (items, counts, errors, first) of the k largest counters, ties
+        # broken by first position
+        order = np.lexsort((self.first, -self.counts))[:k]
+        return self.items[order], self.counts[order], self.errors[order], self.first[order]
+
+
+class HyperLogLog:
+    """Mergeable distinct-count estimator with 2**p one-byte registers.
+
+    The relative standard error is about 1.04 / sqrt(2**p), 0.8% for the
+    default p=14 (16 KiB).
+    """
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def update(self, values):
+        values = pd.Series(values).dropna().to_numpy()
+        hashes = pd.util.hash_array(values) if len(values) else np.empty(0, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+
+        # Position of the leftmost 1-bit in the remaining 64 - p bits
+        bit_length = np.zeros(len(rest), dtype=np.int64)
+        for shift in (32, 16, 8, 4, 2, 1):
+            high = rest >= np.uint64(1 << shift)
+            bit_length[high] += shift
+            rest[high] >>= np.uint64(shift)
+        bit_length += rest > 0
+        np.maximum.at(self.registers, index, (64 - self.p - bit_length + 1).astype(np.uint8))
+        return self
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
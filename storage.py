@@ -0,0 +1,158 @@
+import glob
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# Column types of the cleaned event chunks. Ids use the narrowest integer
+# type that holds them (category ids need all 64 bits), low-cardinality
+# strings are dictionary encoded.
+ID_TYPES = {'product_id': 'int32', 'category_id': 'int64', 'user_id': 'uint32'}
+VALUE_TYPES = {'price': 'float32', 'event_hour': 'int8'}
+CATEGORICAL_COLUMNS = ['event_type', 'category_code', 'brand', 'main_category', 'price_chunk', 'time_of_day']
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+# Prices have cents; float32 holds them to the cent below 65,536
+PRICE_DECIMALS = 2
+
+
+MANIFEST_FILE = '_manifest.json'
+BUCKET_PATTERN = re.compile(r'_b(\d+)\.parquet$')
+
+
+def chunk_path(output_folder, chunk_number, bucket=None):
+    suffix = '' if bucket is None else f'_b{bucket:03d}'
+    return os.path.join(output_folder, f'chunk_{chunk_number:05d}{suffix}.parquet')
+
+
+def chunk_files(input_folder):
+    return sorted(glob.glob(os.path.join(input_folder, 'chunk_*.parquet')))
+
+
+def session_buckets(user_session, buckets):
+    # Stable hash partition of the session ids, identical across runs and
+    # processes (unlike the builtin hash)
+    hashes = pd.util.hash_pandas_object(user_session.astype(str), index=False).to_numpy()
+    return (hashes % buckets).astype('int64')
+
+
+def bucket_files(files):
+    # {bucket: files} when every chunk file belongs to a session bucket,
+    # otherwise None
+    buckets = {}
+    for path in files:
+        match = BUCKET_PATTERN.search(path)
+        if match is None:
+            return None
+        buckets.setdefault(int(match.group(1)), []).append(path)
+    return dict(sorted(buckets.items()))
+
+
+def write_chunk(chunk, output_folder, chunk_number, buckets=0):
+    # With buckets the chunk is split by session hash into one file per
+    # non-empty bucket, so all events of a session share a bucket across
+    # chunks. Returns the written paths.
+    if buckets:
+        parts = chunk.groupby(session_buckets(chunk['user_session'], buckets), sort=True)
+        return [_write_part(part, chunk_path(output_folder, chunk_number, bucket)) for bucket, part in parts]
+    return [_write_part(chunk, chunk_path(output_folder, chunk_number))]
+
+
+def apply_schema(chunk):
+    # Casts a cleaned chunk to the declared column types
+    for col, dtype in ID_TYPES.items():
+        if col in chunk:
+            info = np.iinfo(dtype)
+            if len(chunk) and (chunk[col].min() < info.min or chunk[col].max() > info.max):
+                raise ValueError(f"{col} values do not fit in {dtype}")
+    chunk = chunk.astype({col: dtype for col, dtype in {**ID_TYPES, **VALUE_TYPES}.items() if col in chunk})
+    chunk = chunk.astype({col: 'category' for col in CATEGORICAL_COLUMNS if col in chunk})
+    chunk['event_time'] = pd.to_datetime(chunk['event_time'], utc=True)
+    return chunk
+
+
+def price_values(price):
+    # float64 prices for sums and means: rounding the widened float32 values
+    # gives back the decimal prices the raw files hold
+    return price.astype('float64').round(PRICE_DECIMALS)
+
+
+def _write_part(chunk, output_file):
+    # Same dictionary index width in every file, so chunks stack into one dataset
+    table = pa.Table.from_pandas(apply_schema(chunk), preserve_index=False)
+    schema = pa.schema([
+        field.with_type(DICTIONARY_TYPE) if field.name in CATEGORICAL_COLUMNS else field
+        for field in table.schema
+    ])
+    pq.write_table(table.cast(schema), output_file)
+    return output_file
+
+
+def read_events(input_folder, columns=None, files=None, sessions=None):
+    # Only the requested columns are read from disk; every column comes back
+    # in its declared type. `sessions` restricts the rows to those
+    # user_session ids.
+    files = chunk_files(input_folder) if files is None else files
+    if not files:
+        raise FileNotFoundError(f"No cleaned chunks found in {input_folder}")
+    row_filter = None if sessions is None else ds.field('user_session').isin(list(sessions))
+    table = ds.dataset(files, format='parquet').to_table(columns=columns, filter=row_filter)
+    if 'user_session' not in table.column_names:
+        return table.to_pandas()
+
+    # Session ids are dictionary encoded before they become Python strings
+    index = table.column_names.index('user_session')
+    table = table.set_column(index, 'user_session', pc.dictionary_encode(table.column('user_session')))
+    events = table.to_pandas()
+    events['user_session'] = sorted_categories(events['user_session'])
+    return events
+
+
+def sorted_categories(values):
+    # Numbers the categories in sorted order, so the integer codes sort and
+    # group the same way as the strings
+    return values.cat.reorder_categories(values.cat.categories.sort_values())
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def file_digest(path, block_size=1 << 20):
+    # Content hash, for telling a rewritten file from a merely touched one
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remove_chunks(output_folder, first_chunk, last_chunk):
+    # Every file (all buckets) of chunks first_chunk..last_chunk
+    for chunk_number in range(first_chunk, last_chunk + 1):
+        for path in glob.glob(os.path.join(output_folder, f'chunk_{chunk_number:05d}*.parquet')):
+            os.remove(path)
+
+
+def read_manifest(output_folder):
+    # Which raw files were cleaned into which chunks, and with which price
+    # thresholds; None when the folder has no manifest yet.
+    path = os.path.join(output_folder, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(output_folder, manifest):
+    path = os.path.join(output_folder, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
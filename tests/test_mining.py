@@ -0,0 +1,64 @@
+import os
+import sys
+from collections import Counter
+from itertools import combinations
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mining import mine_topk
+from sequences import EVENT_TYPES, EventSequences
+
+
+def brute_force_topk(sessions, min_len, required, k):
+    # Every distinct subsequence of every session, counted once per session
+    support = Counter()
+    for session in sessions:
+        support.update({
+            tuple(session[i] for i in positions)
+            for length in range(1, len(session) + 1)
+            for positions in combinations(range(len(session)), length)
+        })
+    qualifying = [
+        (count, pattern) for pattern, count in support.items()
+        if len(pattern) >= min_len and (required is None or set(required) & set(pattern))
+    ]
+    qualifying.sort(key=lambda entry: (-entry[0], entry[1]))
+    return [(count, list(pattern)) for count, pattern in qualifying[:k]]
+
+
+def random_sessions(seed, n_sessions=40, max_len=7):
+    # Few event types and short sessions, so supports tie often
+    rng = np.random.default_rng(seed)
+    weights = [0.55, 0.25, 0.08, 0.12]
+    return [
+        list(rng.choice(EVENT_TYPES, size=rng.integers(1, max_len + 1), p=weights))
+        for _ in range(n_sessions)
+    ]
+
+
+VARIANTS = [(1, None), (2, None), (3, None), (1, ['purchase']), (2, ['cart', 'remove_from_cart'])]
+
+
+@pytest.mark.parametrize('seed', range(8))
+@pytest.mark.parametrize('k', [1, 5, 20])
+def test_mine_topk_matches_brute_force(seed, k):
+    sessions = random_sessions(seed)
+    results = mine_topk(EventSequences.from_lists(sessions), VARIANTS, k)
+    for (min_len, required), result in zip(VARIANTS, results):
+        assert result == brute_force_topk(sessions, min_len, required, k)
+
+
+def test_mine_topk_breaks_ties_by_pattern():
+    # view, cart and purchase all have support 2; k cuts through the tie
+    sessions = [['view', 'cart'], ['purchase', 'view'], ['cart', 'purchase']]
+    [result] = mine_topk(EventSequences.from_lists(sessions), [(1, None)], 2)
+    assert result == [(2, ['cart']), (2, ['purchase'])]
+
+
+def test_mine_topk_without_qualifying_patterns():
+    sessions = [['view', 'view'], ['view']]
+    results = mine_topk(EventSequences.from_lists(sessions), [(3, None), (1, ['purchase'])], 5)
+    assert results == [[], []]
@@ -1,8 +1,14 @@
 import pandas as pd
 
-price_df = pd.read_csv('./analysis_results/price_chunk.csv')
-category_df = pd.read_csv('./analysis_results/main_category.csv')
-time_df = pd.read_csv('./analysis_results/time_of_day.csv')
+import instrument
+
+instrument.start('understand_patterns')
+# analysis.py writes all sections into one file
+with instrument.stage('read_csv'):
+    patterns_df = pd.read_csv('./analysis_results/deep_dive_patterns.csv')
+    price_df = patterns_df[patterns_df['section'] == 'price_chunk']
+    category_df = patterns_df[patterns_df['section'] == 'main_category']
+    time_df = patterns_df[patterns_df['section'] == 'time_of_day']
 
 TOP_N = 5  # Top N patterns to keep per group
 
@@ -59,15 +65,17 @@ def analyze_section(df, section_name):
 
 # Run Analysis
 print("\n Starting analysis...")
-price_summary = analyze_section(price_df, 'price_chunk')
-category_summary = analyze_section(category_df, 'main_category')
-time_summary = analyze_section(time_df, 'time_of_day')
+with instrument.stage('summarize'):
+    price_summary = analyze_section(price_df, 'price_chunk')
+    category_summary = analyze_section(category_df, 'main_category')
+    time_summary = analyze_section(time_df, 'time_of_day')
 
 # save output
 output_folder = './analysis_results'
 
-price_summary.to_csv(f'{output_folder}/summary_price_chunk.csv', index=False)
-category_summary.to_csv(f'{output_folder}/summary_main_category.csv', index=False)
-time_summary.to_csv(f'{output_folder}/summary_time_of_day.csv', index=False)
+with instrument.stage('write_csv'):
+    price_summary.to_csv(f'{output_folder}/summary_price_chunk.csv', index=False)
+    category_summary.to_csv(f'{output_folder}/summary_main_category.csv', index=False)
+    time_summary.to_csv(f'{output_folder}/summary_time_of_day.csv', index=False)
 
 print("\n Summaries saved successfully in 'analysis_results' folder!")
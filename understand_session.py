@@ -1,11 +1,61 @@
 import pandas as pd
 
+import instrument
+from sketches import SpaceSaving
+
 file_path = './session_analysis_with_patterns.csv'
-session_df = pd.read_csv(file_path)
+# Set to a number of counters to count event patterns with a Space-Saving
+# sketch (bounded counting memory, num_sessions_error column) instead of
+# exactly. The pattern column is then streamed from the CSV in chunks of
+# SKETCH_BATCH rows, one sketch per chunk merged into the running one.
+PATTERN_SKETCH_CAPACITY = None
+SKETCH_BATCH = 100_000
+TOP_N = 10
+INTERACTION_ACTIONS = ['cart', 'remove', 'purchase']
+
+def is_interaction(patterns):
+    return patterns.str.contains('|'.join(INTERACTION_ACTIONS), regex=True)
+
+def count_patterns(patterns, interaction_only=False):
+    # Exact counts of the given patterns; in sketch mode the patterns (only
+    # those with interactions if asked) are re-read from the CSV instead
+    if PATTERN_SKETCH_CAPACITY is None:
+        counts = patterns.value_counts().reset_index()
+        counts.columns = ['event_pattern', 'num_sessions']
+        return counts
+
+    sketch = SpaceSaving(PATTERN_SKETCH_CAPACITY)
+    for chunk in pd.read_csv(file_path, usecols=['event_pattern'], chunksize=SKETCH_BATCH):
+        values = chunk['event_pattern'].dropna()
+        if interaction_only:
+            values = values[is_interaction(values)]
+        # File row numbers as positions, so ties keep first-occurrence order
+        part = SpaceSaving(PATTERN_SKETCH_CAPACITY).update(values.to_numpy(dtype=object), values.index.to_numpy())
+        sketch.merge(part)
+    items, counts, errors, _ = sketch.top(PATTERN_SKETCH_CAPACITY)
+    return pd.DataFrame({'event_pattern': items, 'num_sessions': counts, 'num_sessions_error': errors})
+
+def pattern_stats(df, top_patterns):
+    # Stats of all requested patterns in one grouped pass, in the given order
+    subset = df[df['event_pattern'].isin(top_patterns)]
+    stats = subset.groupby('event_pattern', sort=False).agg(
+        num_sessions=('session_duration_sec', 'size'),
+        avg_session_duration_sec=('session_duration_sec', 'mean'),
+        median_session_duration_sec=('session_duration_sec', 'median'),
+        avg_unique_products=('unique_products', 'mean'),
+        avg_unique_brands=('unique_brands', 'mean')
+    )
+    return stats.reindex(top_patterns).rename_axis('event_pattern').reset_index()
+
+instrument.start('understand_session')
+with instrument.stage('read_csv') as stage:
+    session_df = pd.read_csv(file_path)
+    stage.rows_out = len(session_df)
 
 # Ensure datetime columns
-session_df['start_time'] = pd.to_datetime(session_df['start_time'], utc=True)
-session_df['end_time'] = pd.to_datetime(session_df['end_time'], utc=True)
+with instrument.stage('to_datetime', rows_in=len(session_df)):
+    session_df['start_time'] = pd.to_datetime(session_df['start_time'], utc=True)
+    session_df['end_time'] = pd.to_datetime(session_df['end_time'], utc=True)
 
 # --- OVERALL STATS ---
 overall_stats = {
@@ -21,38 +71,27 @@ for k, v in overall_stats.items():
     print(f"{k.replace('_', ' ').title()}: {v:.2f}")
 
 # --- TOP PATTERN COUNTS ---
-pattern_counts = session_df['event_pattern'].value_counts().reset_index()
-pattern_counts.columns = ['event_pattern', 'num_sessions']
+with instrument.stage('pattern_counts', rows_in=len(session_df)) as stage:
+    pattern_counts = count_patterns(session_df['event_pattern'])
+    stage.rows_out = len(pattern_counts)
 
-print("\n--- Top 10 Most Common Event Patterns ---")
-print(pattern_counts.head(10).to_string(index=False))
+print(f"\n--- Top {TOP_N} Most Common Event Patterns ---")
+print(pattern_counts.head(TOP_N).to_string(index=False))
 
 # --- TOP PATTERN STATS ---
-top_patterns = pattern_counts['event_pattern'].head(10).tolist()
-pattern_analysis = []
-
-for pattern in top_patterns:
-    subset = session_df[session_df['event_pattern'] == pattern]
-    pattern_analysis.append({
-        'event_pattern': pattern,
-        'num_sessions': len(subset),
-        'avg_session_duration_sec': subset['session_duration_sec'].mean(),
-        'median_session_duration_sec': subset['session_duration_sec'].median(),
-        'avg_unique_products': subset['unique_products'].mean(),
-        'avg_unique_brands': subset['unique_brands'].mean()
-    })
-
-pattern_stats_df = pd.DataFrame(pattern_analysis)
-
-print("\n--- Detailed Stats for Top 10 Patterns ---")
+top_patterns = pattern_counts['event_pattern'].head(TOP_N).tolist()
+with instrument.stage('pattern_stats', rows_in=len(session_df)):
+    pattern_stats_df = pattern_stats(session_df, top_patterns)
+
+print(f"\n--- Detailed Stats for Top {TOP_N} Patterns ---")
 print(pattern_stats_df)
 
 # --- BROWSING VS INTERACTION ---
-def is_browsing_only(pattern):
-    actions = ['cart', 'remove', 'purchase']
-    return not any(action in pattern for action in actions)
-
-session_df['is_browsing_only'] = session_df['event_pattern'].apply(is_browsing_only)
+# Classify each distinct pattern once and broadcast back to the sessions
+with instrument.stage('interaction_flag', rows_in=len(session_df)):
+    pattern_codes, unique_patterns = pd.factorize(session_df['event_pattern'])
+    browsing_only = ~is_interaction(unique_patterns)
+    session_df['is_browsing_only'] = browsing_only[pattern_codes]
 
 browsing_sessions = session_df[session_df['is_browsing_only']]
 interaction_sessions = session_df[~session_df['is_browsing_only']]
@@ -82,29 +121,32 @@ for k, v in interaction_stats.items():
     print(f"{k.replace('_', ' ').title()}: {v:.2f}")
 
 # --- INTERACTION PATTERNS ---
-interaction_patterns_df = interaction_sessions['event_pattern'].value_counts().reset_index()
-interaction_patterns_df.columns = ['event_pattern', 'num_sessions']
+with instrument.stage('pattern_counts', rows_in=len(interaction_sessions)) as stage:
+    interaction_patterns_df = count_patterns(interaction_sessions['event_pattern'], interaction_only=True)
+    stage.rows_out = len(interaction_patterns_df)
 
-print("\n--- Top 10 Most Common Event Patterns (with Interactions) ---")
-print(interaction_patterns_df.head(10).to_string(index=False))
+print(f"\n--- Top {TOP_N} Most Common Event Patterns (with Interactions) ---")
+print(interaction_patterns_df.head(TOP_N).to_string(index=False))
 
 print("\n⏱️ Avg Duration for Top Interaction Patterns:")
-for pattern in interaction_patterns_df['event_pattern'].head(10):
-    subset = interaction_sessions[interaction_sessions['event_pattern'] == pattern]
-    print(f"Pattern: {pattern}")
-    print(f"  Sessions: {len(subset)}")
-    print(f"  Avg Duration: {subset['session_duration_sec'].mean():.2f} sec")
-    print(f"  Avg Unique Products: {subset['unique_products'].mean():.2f}")
-    print(f"  Avg Unique Brands: {subset['unique_brands'].mean():.2f}")
+with instrument.stage('pattern_stats', rows_in=len(interaction_sessions)):
+    interaction_stats_df = pattern_stats(interaction_sessions, interaction_patterns_df['event_pattern'].head(TOP_N).tolist())
+for row in interaction_stats_df.itertuples(index=False):
+    print(f"Pattern: {row.event_pattern}")
+    print(f"  Sessions: {row.num_sessions}")
+    print(f"  Avg Duration: {row.avg_session_duration_sec:.2f} sec")
+    print(f"  Avg Unique Products: {row.avg_unique_products:.2f}")
+    print(f"  Avg Unique Brands: {row.avg_unique_brands:.2f}")
     print()
 
 # --- SAVE OUTPUTS ---
-pattern_counts.to_csv('pattern_counts.csv', index=False)
-pattern_stats_df.to_csv('pattern_stats_top10.csv', index=False)
-browsing_sessions.to_csv('browsing_only_sessions.csv', index=False)
-interaction_sessions.to_csv('interaction_sessions.csv', index=False)
-interaction_patterns_df.to_csv('interaction_pattern_counts.csv', index=False)
+with instrument.stage('write_csv', rows_in=len(session_df)):
+    pattern_counts.to_csv('pattern_counts.csv', index=False)
+    pattern_stats_df.to_csv(f'pattern_stats_top{TOP_N}.csv', index=False)
+    browsing_sessions.to_csv('browsing_only_sessions.csv', index=False)
+    interaction_sessions.to_csv('interaction_sessions.csv', index=False)
+    interaction_patterns_df.to_csv('interaction_pattern_counts.csv', index=False)
 
 print("\n✅ Analysis complete!")
-print("Files saved: pattern_counts.csv, pattern_stats_top10.csv, browsing_only_sessions.csv, interaction_sessions.csv, interaction_pattern_counts.csv")
+print(f"Files saved: pattern_counts.csv, pattern_stats_top{TOP_N}.csv, browsing_only_sessions.csv, interaction_sessions.csv, interaction_pattern_counts.csv")
 